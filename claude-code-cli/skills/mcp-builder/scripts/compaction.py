@@ -0,0 +1,121 @@
+"""Context compaction for long agent conversations.
+
+Every turn re-sends every earlier tool result, so long tasks get
+quadratically slower and more expensive. Compaction rewrites stale
+tool_result blocks in place: results superseded by a later identical call
+are replaced with a short note, and old results are truncated (oldest
+first) until the conversation fits the token budget.
+"""
+
+import json
+from typing import Any
+
+from metrics import CHARS_PER_TOKEN
+
+SUPERSEDED_NOTE = "[Result superseded by a later call to {name} with the same arguments]"
+TRUNCATED_NOTE = "\n[... {dropped} characters removed by context compaction]"
+
+
+def _get(block: Any, field: str) -> Any:
+    """Read a field from an SDK content block or a plain dict."""
+    return block.get(field) if isinstance(block, dict) else getattr(block, field, None)
+
+
+def _content_chars(content: Any) -> int:
+    if isinstance(content, str):
+        return len(content)
+    chars = 0
+    for block in content:
+        block_type = _get(block, "type")
+        if block_type == "text":
+            chars += len(_get(block, "text") or "")
+        elif block_type == "tool_use":
+            chars += len(json.dumps(_get(block, "input"), default=str))
+        elif block_type == "tool_result":
+            chars += _content_chars(_get(block, "content") or "")
+    return chars
+
+
+def estimate_tokens(messages: list[dict[str, Any]]) -> int:
+    """Estimate the prompt size of a conversation from its length."""
+    return sum(_content_chars(message["content"]) for message in messages) // CHARS_PER_TOKEN
+
+
+def _is_compacted(content: str) -> bool:
+    return content.startswith("[Result superseded") or content.endswith("removed by context compaction]")
+
+
+def compact_messages(
+    messages: list[dict[str, Any]],
+    budget_tokens: int,
+    keep_recent: int = 2,
+    keep_chars: int = 500,
+) -> dict[str, int] | None:
+    """Compact stale tool results in messages, in place.
+
+    Args:
+        messages: Conversation in Messages API format
+        budget_tokens: Estimated prompt size to stay under
+        keep_recent: Number of most recent tool-result messages left untouched
+        keep_chars: Characters kept from the start of a truncated result
+
+    Returns:
+        Estimated tokens before and after, tokens saved, and how many results
+        were superseded or truncated; None if nothing changed.
+    """
+    calls = {}
+    for message in messages:
+        if message["role"] == "assistant" and not isinstance(message["content"], str):
+            for block in message["content"]:
+                if _get(block, "type") == "tool_use":
+                    arguments = json.dumps(_get(block, "input"), sort_keys=True, default=str)
+                    calls[_get(block, "id")] = (_get(block, "name"), arguments)
+
+    result_messages = [
+        index for index, message in enumerate(messages)
+        if message["role"] == "user" and isinstance(message["content"], list)
+    ]
+    recent = set(result_messages[-keep_recent:]) if keep_recent > 0 else set()
+    stale = [
+        block
+        for index in result_messages if index not in recent
+        for block in messages[index]["content"]
+        if block.get("type") == "tool_result" and isinstance(block.get("content"), str)
+    ]
+    latest = {}
+    for index in result_messages:
+        for block in messages[index]["content"]:
+            if block.get("type") == "tool_result":
+                latest[calls.get(block["tool_use_id"])] = block
+
+    before = estimate_tokens(messages)
+    superseded = truncated = 0
+
+    for block in stale:
+        call = calls.get(block["tool_use_id"])
+        if call is not None and latest[call] is not block and not _is_compacted(block["content"]):
+            block["content"] = SUPERSEDED_NOTE.format(name=call[0])
+            superseded += 1
+
+    estimate = estimate_tokens(messages)
+    for block in stale:
+        if estimate <= budget_tokens:
+            break
+        content = block["content"]
+        if _is_compacted(content) or len(content) <= keep_chars:
+            continue
+        dropped = len(content) - keep_chars
+        block["content"] = content[:keep_chars] + TRUNCATED_NOTE.format(dropped=dropped)
+        estimate -= (len(content) - len(block["content"])) // CHARS_PER_TOKEN
+        truncated += 1
+
+    if not superseded and not truncated:
+        return None
+    after = estimate_tokens(messages)
+    return {
+        "before_tokens": before,
+        "after_tokens": after,
+        "saved_tokens": before - after,
+        "superseded": superseded,
+        "truncated": truncated,
+    }
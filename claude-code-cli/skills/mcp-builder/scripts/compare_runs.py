@@ -0,0 +1,388 @@
+"""Evaluation Run Comparison
+
+This script compares two evaluation runs recorded with `evaluation.py
+--results` and flags statistically significant regressions of the candidate
+against the baseline: accuracy, task latency, tool calls, tokens and
+per-tool latency percentiles. It exits with status 1 if any are found, so it
+can gate releases in CI.
+
+Questions are matched by their text, so both runs need not use the same
+evaluation file order. A change counts as a regression only if it exceeds
+its threshold and is unlikely to be noise:
+
+- Per-question task duration, tool calls and tokens are paired, and tested
+  with a one-sided Wilcoxon signed-rank test.
+- Accuracy is tested with an exact one-sided McNemar test on the questions
+  whose outcome changed.
+- Per-tool latency percentiles get a bootstrap confidence interval for the
+  ratio of candidate to baseline; it must lie entirely above 1.
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+from pathlib import Path
+from typing import Any
+
+from metrics import percentile
+from results import read_results
+
+BOOTSTRAP_RESAMPLES = 1000
+
+
+def normal_sf(z: float) -> float:
+    """Upper tail probability of the standard normal distribution."""
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def wilcoxon_greater(differences: list[float]) -> float:
+    """One-sided p-value that paired differences tend to be positive (Wilcoxon signed-rank).
+
+    Uses the normal approximation with tie correction; zero differences are
+    dropped.
+    """
+    nonzero = sorted((abs(d), d > 0) for d in differences if d != 0)
+    n = len(nonzero)
+    if n == 0:
+        return 1.0
+    # Average ranks over ties.
+    ranks: list[float] = []
+    tie_correction = 0.0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and nonzero[j + 1][0] == nonzero[i][0]:
+            j += 1
+        ranks += [(i + j) / 2 + 1] * (j - i + 1)
+        tied = j - i + 1
+        tie_correction += tied**3 - tied
+        i = j + 1
+    positive = sum(rank for rank, (_, is_positive) in zip(ranks, nonzero) if is_positive)
+    mean = n * (n + 1) / 4
+    variance = n * (n + 1) * (2 * n + 1) / 24 - tie_correction / 48
+    if variance <= 0:
+        return 1.0
+    # Continuity correction of 0.5 towards the mean.
+    return normal_sf((positive - mean - 0.5) / math.sqrt(variance))
+
+
+def mcnemar_greater(lost: int, gained: int) -> float:
+    """One-sided exact McNemar p-value that questions are lost more often than gained."""
+    n = lost + gained
+    if n == 0:
+        return 1.0
+    return sum(math.comb(n, k) for k in range(lost, n + 1)) / 2**n
+
+
+def bootstrap_ratio(baseline: list[float], candidate: list[float], q: float, seed: int = 0) -> tuple[float, float]:
+    """95% bootstrap confidence interval for the ratio of candidate to baseline q-th percentiles."""
+    rng = random.Random(seed)
+    ratios = []
+    for _ in range(BOOTSTRAP_RESAMPLES):
+        base = percentile(sorted(rng.choices(baseline, k=len(baseline))), q)
+        cand = percentile(sorted(rng.choices(candidate, k=len(candidate))), q)
+        ratios.append(cand / base if base else math.inf)
+    ratios.sort()
+    return percentile(ratios, 2.5), percentile(ratios, 97.5)
+
+
+def relative_change(baseline: float, candidate: float) -> float | None:
+    """(candidate - baseline) / baseline, or None if the baseline is 0."""
+    return (candidate - baseline) / baseline if baseline else None
+
+
+def total_tokens(result: dict[str, Any]) -> int:
+    return sum(result.get("tokens", {}).values())
+
+
+def compare_runs(
+    baseline: list[dict[str, Any]],
+    candidate: list[dict[str, Any]],
+    latency_threshold: float = 0.10,
+    tool_calls_threshold: float = 0.10,
+    tokens_threshold: float = 0.10,
+    accuracy_threshold: float = 0.0,
+    alpha: float = 0.05,
+    q: float = 95,
+) -> dict[str, Any]:
+    """Line up two runs' results by question and find significant regressions.
+
+    Thresholds are relative increases (0.10 is 10%), except accuracy_threshold,
+    an absolute drop in accuracy (0.05 is 5 points). q is the tool and task
+    latency percentile that is compared.
+    """
+    base_by_question = {result["question"]: result for result in baseline}
+    cand_by_question = {result["question"]: result for result in candidate}
+    pairs = [(base_by_question[question], cand_by_question[question]) for question in base_by_question if question in cand_by_question]
+    regressions: list[str] = []
+
+    questions = []
+    for base, cand in pairs:
+        questions.append({
+            "task_index": cand["task_index"],
+            "question": cand["question"],
+            "correct": [base["score"] >= 0.5, cand["score"] >= 0.5],
+            "duration": [base["total_duration"], cand["total_duration"]],
+            "tool_calls": [base["num_tool_calls"], cand["num_tool_calls"]],
+            "tokens": [total_tokens(base), total_tokens(cand)],
+        })
+
+    lost = sum(1 for question in questions if question["correct"] == [True, False])
+    gained = sum(1 for question in questions if question["correct"] == [False, True])
+    base_accuracy = sum(question["correct"][0] for question in questions) / len(questions) if questions else 0.0
+    cand_accuracy = sum(question["correct"][1] for question in questions) / len(questions) if questions else 0.0
+    accuracy = {
+        "baseline": base_accuracy,
+        "candidate": cand_accuracy,
+        "lost": lost,
+        "gained": gained,
+        "p_value": mcnemar_greater(lost, gained),
+    }
+    accuracy["regression"] = base_accuracy - cand_accuracy > accuracy_threshold and accuracy["p_value"] < alpha
+    if accuracy["regression"]:
+        regressions.append(f"accuracy fell from {base_accuracy:.1%} to {cand_accuracy:.1%} ({lost} questions lost, {gained} gained)")
+
+    paired = {}
+    for metric, threshold in (("duration", latency_threshold), ("tool_calls", tool_calls_threshold), ("tokens", tokens_threshold)):
+        base_values = [question[metric][0] for question in questions]
+        cand_values = [question[metric][1] for question in questions]
+        change = relative_change(sum(base_values), sum(cand_values))
+        stats = {
+            "baseline_mean": sum(base_values) / len(questions) if questions else 0.0,
+            "candidate_mean": sum(cand_values) / len(questions) if questions else 0.0,
+            "change": change,
+            "p_value": wilcoxon_greater([cand - base for base, cand in zip(base_values, cand_values)]),
+        }
+        if metric == "duration":
+            stats["baseline_p"] = percentile(sorted(base_values), q)
+            stats["candidate_p"] = percentile(sorted(cand_values), q)
+        stats["regression"] = change is not None and change > threshold and stats["p_value"] < alpha
+        if stats["regression"]:
+            regressions.append(f"{metric.replace('_', ' ')} per task rose {change:+.1%} (p={stats['p_value']:.3g})")
+        paired[metric] = stats
+
+    def durations(results: list[dict[str, Any]], tool: str) -> list[float]:
+        return [duration for result in results for duration in result["tool_calls"].get(tool, {}).get("durations", [])]
+
+    matched_base = [base for base, _ in pairs]
+    matched_cand = [cand for _, cand in pairs]
+    tools = {}
+    tool_names = sorted({name for result in matched_base + matched_cand for name in result["tool_calls"]})
+    for name in tool_names:
+        base_durations = sorted(durations(matched_base, name))
+        cand_durations = sorted(durations(matched_cand, name))
+        stats = {
+            "calls": [len(base_durations), len(cand_durations)],
+            "p50": [percentile(base_durations, 50), percentile(cand_durations, 50)],
+            "p": [percentile(base_durations, q), percentile(cand_durations, q)],
+            "change": None,
+            "ci": None,
+            "regression": False,
+        }
+        if base_durations and cand_durations:
+            stats["change"] = relative_change(*stats["p"])
+            stats["ci"] = bootstrap_ratio(base_durations, cand_durations, q)
+            stats["regression"] = (
+                stats["change"] is not None and stats["change"] > latency_threshold and stats["ci"][0] > 1
+            )
+            if stats["regression"]:
+                low, high = stats["ci"]
+                regressions.append(
+                    f"`{name}` p{q:g} latency rose {stats['change']:+.1%} "
+                    f"({stats['p'][0]:.3f}s → {stats['p'][1]:.3f}s, 95% CI {low:.2f}×–{high:.2f}×)"
+                )
+        tools[name] = stats
+
+    return {
+        "percentile": q,
+        "alpha": alpha,
+        "thresholds": {
+            "latency": latency_threshold,
+            "tool_calls": tool_calls_threshold,
+            "tokens": tokens_threshold,
+            "accuracy": accuracy_threshold,
+        },
+        "matched": len(pairs),
+        "only_baseline": len(base_by_question) - len(pairs),
+        "only_candidate": len(cand_by_question) - len(pairs),
+        "accuracy": accuracy,
+        "paired": paired,
+        "tools": tools,
+        "questions": questions,
+        "regressions": regressions,
+    }
+
+
+REPORT_HEADER = """
+# Run Comparison
+
+Baseline `{baseline}` vs candidate `{candidate}`: {matched} questions matched{unmatched}.
+
+## Verdict: {verdict}
+
+{regression_lines}## Summary
+
+Changes are flagged when they exceed their threshold and are significant at α = {alpha:g} (one-sided).
+
+| Metric | Baseline | Candidate | Change | p-value | Threshold | Regression |
+|---|---|---|---|---|---|---|
+{summary_rows}
+
+## Tool Latency
+
+p{q:g} change with a 95% bootstrap interval for the candidate/baseline ratio.
+
+| Tool | Calls | p50 (s) | p{q:g} (s) | p{q:g} Change | 95% CI | Regression |
+|---|---|---|---|---|---|---|
+{tool_rows}
+
+## Per Question
+
+| # | Question | Correct | Duration (s) | Tool Calls | Tokens |
+|---|---|---|---|---|---|
+{question_rows}
+"""
+
+
+def format_change(change: float | None) -> str:
+    return f"{change:+.1%}" if change is not None else "N/A"
+
+
+def build_comparison_report(comparison: dict[str, Any], baseline_name: str, candidate_name: str) -> str:
+    """Render a comparison from compare_runs as Markdown."""
+    thresholds = comparison["thresholds"]
+    flag = {True: "❌", False: "✅"}
+    unmatched = ""
+    if comparison["only_baseline"] or comparison["only_candidate"]:
+        unmatched = f" ({comparison['only_baseline']} only in the baseline, {comparison['only_candidate']} only in the candidate)"
+
+    accuracy = comparison["accuracy"]
+    summary_rows = [
+        f"| Accuracy | {accuracy['baseline']:.1%} | {accuracy['candidate']:.1%} | "
+        f"{(accuracy['candidate'] - accuracy['baseline']) * 100:+.1f} pp ({accuracy['lost']} lost, {accuracy['gained']} gained) | "
+        f"{accuracy['p_value']:.3g} | −{thresholds['accuracy'] * 100:g} pp | {flag[accuracy['regression']]} |"
+    ]
+    for metric, label, unit, threshold in (
+        ("duration", "Task duration (mean)", "s", thresholds["latency"]),
+        ("tool_calls", "Tool calls per task", "", thresholds["tool_calls"]),
+        ("tokens", "Tokens per task", "", thresholds["tokens"]),
+    ):
+        stats = comparison["paired"][metric]
+        precision = ".2f" if unit else ".1f"
+        summary_rows.append(
+            f"| {label} | {stats['baseline_mean']:{precision}}{unit} | {stats['candidate_mean']:{precision}}{unit} | "
+            f"{format_change(stats['change'])} | {stats['p_value']:.3g} | +{threshold:.0%} | {flag[stats['regression']]} |"
+        )
+    duration = comparison["paired"]["duration"]
+    summary_rows.insert(2, (
+        f"| Task duration (p{comparison['percentile']:g}) | {duration['baseline_p']:.2f}s | {duration['candidate_p']:.2f}s | "
+        f"{format_change(relative_change(duration['baseline_p'], duration['candidate_p']))} | | | |"
+    ))
+
+    tool_rows = []
+    for name, stats in comparison["tools"].items():
+        ci = f"{stats['ci'][0]:.2f}×–{stats['ci'][1]:.2f}×" if stats["ci"] else "N/A"
+        tool_rows.append(
+            f"| `{name}` | {stats['calls'][0]} → {stats['calls'][1]} | {stats['p50'][0]:.3f} → {stats['p50'][1]:.3f} | "
+            f"{stats['p'][0]:.3f} → {stats['p'][1]:.3f} | {format_change(stats['change'])} | {ci} | {flag[stats['regression']]} |"
+        )
+
+    question_rows = []
+    for question in comparison["questions"]:
+        text = question["question"].replace("|", "\\|").replace("\n", " ")
+        text = text if len(text) <= 60 else text[:57] + "..."
+        correct = " → ".join("✅" if correct else "❌" for correct in question["correct"])
+        question_rows.append(
+            f"| {question['task_index'] + 1} | {text} | {correct} | "
+            f"{question['duration'][0]:.2f} → {question['duration'][1]:.2f} | "
+            f"{question['tool_calls'][0]} → {question['tool_calls'][1]} | {question['tokens'][0]} → {question['tokens'][1]} |"
+        )
+
+    regressions = comparison["regressions"]
+    return REPORT_HEADER.format(
+        baseline=baseline_name,
+        candidate=candidate_name,
+        matched=comparison["matched"],
+        unmatched=unmatched,
+        verdict=f"❌ {len(regressions)} regressions" if regressions else "✅ No regressions",
+        regression_lines="".join(f"- {line}\n" for line in regressions) + ("\n" if regressions else ""),
+        alpha=comparison["alpha"],
+        summary_rows="\n".join(summary_rows),
+        q=comparison["percentile"],
+        tool_rows="\n".join(tool_rows) or "| _no tool calls_ | | | | | | |",
+        question_rows="\n".join(question_rows) or "| | _no matching questions_ | | | | |",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two evaluation runs and flag significant regressions",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Record both runs
+  python evaluation.py -c python -a server_v1.py --results v1.jsonl eval.xml
+  python evaluation.py -c python -a server_v2.py --results v2.jsonl eval.xml
+
+  # Fail if v2 is significantly worse than v1
+  python compare_runs.py v1.jsonl v2.jsonl
+
+  # Allow up to 20% slower p95 tool latency and a 5 point accuracy drop
+  python compare_runs.py --latency-threshold 0.2 --accuracy-threshold 0.05 v1.jsonl v2.jsonl
+
+Exit status is 0 without regressions, 1 with regressions and 2 on errors.
+        """,
+    )
+
+    parser.add_argument("baseline", type=Path, help="Baseline results JSONL written by evaluation.py --results")
+    parser.add_argument("candidate", type=Path, help="Candidate results JSONL written by evaluation.py --results")
+    parser.add_argument("--percentile", type=float, default=95, help="Latency percentile compared per tool and task (default: 95)")
+    parser.add_argument("--latency-threshold", type=float, default=0.10, help="Relative latency increase flagged as a regression (default: 0.10)")
+    parser.add_argument("--tool-calls-threshold", type=float, default=0.10, help="Relative increase in tool calls per task flagged (default: 0.10)")
+    parser.add_argument("--tokens-threshold", type=float, default=0.10, help="Relative increase in tokens per task flagged (default: 0.10)")
+    parser.add_argument("--accuracy-threshold", type=float, default=0.0, help="Accuracy drop, as a fraction, tolerated before flagging (default: 0)")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Significance level of the one-sided tests (default: 0.05)")
+    parser.add_argument("-o", "--output", type=Path, help="Output file for the comparison report (default: stdout)")
+    parser.add_argument("--json", type=Path, help="Write the comparison to this JSON file")
+
+    args = parser.parse_args()
+
+    for path in (args.baseline, args.candidate):
+        if not path.exists():
+            print(f"Error: Results file not found: {path}")
+            sys.exit(2)
+    if not 0 < args.percentile < 100:
+        print("Error: --percentile must be between 0 and 100")
+        sys.exit(2)
+
+    comparison = compare_runs(
+        read_results(args.baseline),
+        read_results(args.candidate),
+        latency_threshold=args.latency_threshold,
+        tool_calls_threshold=args.tool_calls_threshold,
+        tokens_threshold=args.tokens_threshold,
+        accuracy_threshold=args.accuracy_threshold,
+        alpha=args.alpha,
+        q=args.percentile,
+    )
+    if not comparison["matched"]:
+        print("Error: The runs have no questions in common")
+        sys.exit(2)
+
+    report = build_comparison_report(comparison, str(args.baseline), str(args.candidate))
+    if args.json:
+        args.json.write_text(json.dumps(comparison, indent=2))
+        print(f"📈 Comparison saved to {args.json}")
+    if args.output:
+        args.output.write_text(report)
+        print(f"✅ Report saved to {args.output}")
+    else:
+        print(report)
+
+    sys.exit(1 if comparison["regressions"] else 0)
+
+
+if __name__ == "__main__":
+    main()
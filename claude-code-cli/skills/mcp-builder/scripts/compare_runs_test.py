@@ -0,0 +1,104 @@
+import math
+import unittest
+
+from compare_runs import bootstrap_ratio, compare_runs, mcnemar_greater, normal_sf, wilcoxon_greater
+
+
+def result(index, score, duration, tool_durations):
+    """Helper to build a per-question result as written by evaluation.py --results"""
+    return {
+        "task_index": index,
+        "question": f"question {index}",
+        "score": score,
+        "total_duration": duration,
+        "num_tool_calls": len(tool_durations),
+        "tokens": {"input_tokens": 100, "output_tokens": 10},
+        "tool_calls": {"search": {"count": len(tool_durations), "durations": tool_durations}},
+    }
+
+
+class TestWilcoxon(unittest.TestCase):
+
+    # Textbook example (as on Wikipedia's "Wilcoxon signed-rank test" page):
+    # ten paired observations, one zero difference and one tie, T+ = 27.
+    PAIRS = [(125, 110), (115, 122), (130, 125), (140, 120), (140, 140),
+             (115, 124), (140, 123), (125, 137), (140, 135), (135, 145)]
+
+    def test_textbook_example(self):
+        differences = [after - before for after, before in self.PAIRS]
+        # n = 9 after dropping the zero; variance 9*10*19/24 less (2^3 - 2)/48 for the tied 5s.
+        z = (27 - 22.5 - 0.5) / math.sqrt(71.25 - 6 / 48)
+        self.assertAlmostEqual(wilcoxon_greater(differences), normal_sf(z))
+        self.assertAlmostEqual(wilcoxon_greater(differences), 0.3176, places=4)
+
+    def test_consistent_increase_is_significant(self):
+        self.assertLess(wilcoxon_greater([0.5 + i / 10 for i in range(20)]), 0.001)
+        self.assertGreater(wilcoxon_greater([-0.5 - i / 10 for i in range(20)]), 0.999)
+
+    def test_no_differences(self):
+        self.assertEqual(wilcoxon_greater([]), 1.0)
+        self.assertEqual(wilcoxon_greater([0, 0, 0]), 1.0)
+
+
+class TestMcNemar(unittest.TestCase):
+
+    def test_discordant_pairs(self):
+        """8 lost and 2 gained: P(X >= 8) for X ~ Binomial(10, 1/2)"""
+        self.assertAlmostEqual(mcnemar_greater(8, 2), (45 + 10 + 1) / 1024)
+
+    def test_balanced_and_empty(self):
+        self.assertAlmostEqual(mcnemar_greater(5, 5), 638 / 1024)
+        self.assertEqual(mcnemar_greater(0, 0), 1.0)
+        self.assertEqual(mcnemar_greater(0, 4), 1.0)
+
+
+class TestBootstrap(unittest.TestCase):
+
+    def test_slowdown_interval_excludes_one(self):
+        baseline = [0.1 + i / 1000 for i in range(200)]
+        low, high = bootstrap_ratio(baseline, [2 * value for value in baseline], 95)
+        self.assertGreater(low, 1.5)
+        self.assertLess(high, 2.5)
+        self.assertLessEqual(low, high)
+
+    def test_same_distribution_interval_contains_one(self):
+        baseline = [0.1 + i / 1000 for i in range(200)]
+        low, high = bootstrap_ratio(baseline, list(reversed(baseline)), 50)
+        self.assertLessEqual(low, 1.0)
+        self.assertGreaterEqual(high, 1.0)
+
+    def test_deterministic_for_seed(self):
+        baseline, candidate = [1.0, 2.0, 3.0, 4.0], [2.0, 3.0, 4.0, 5.0]
+        self.assertEqual(bootstrap_ratio(baseline, candidate, 95), bootstrap_ratio(baseline, candidate, 95))
+
+
+class TestCompareRuns(unittest.TestCase):
+
+    def test_no_regression_against_itself(self):
+        run = [result(i, 1.0, 10.0 + i, [0.2, 0.3]) for i in range(20)]
+        comparison = compare_runs(run, run)
+        self.assertEqual(comparison["matched"], 20)
+        self.assertEqual(comparison["regressions"], [])
+
+    def test_flags_slower_tools_and_lost_questions(self):
+        baseline = [result(i, 1.0, 10.0 + i, [0.2 + i / 100] * 5) for i in range(20)]
+        candidate = [result(i, 0.0 if i < 8 else 1.0, 20.0 + i, [0.6 + i / 100] * 5) for i in range(20)]
+        comparison = compare_runs(baseline, candidate)
+        self.assertTrue(comparison["accuracy"]["regression"])
+        self.assertEqual(comparison["accuracy"]["lost"], 8)
+        self.assertTrue(comparison["paired"]["duration"]["regression"])
+        self.assertFalse(comparison["paired"]["tool_calls"]["regression"])
+        self.assertTrue(comparison["tools"]["search"]["regression"])
+
+    def test_matches_questions_by_text(self):
+        baseline = [result(i, 1.0, 10.0, [0.2]) for i in range(5)]
+        candidate = [result(i, 1.0, 10.0, [0.2]) for i in reversed(range(3, 8))]
+        comparison = compare_runs(baseline, candidate)
+        self.assertEqual(
+            (comparison["matched"], comparison["only_baseline"], comparison["only_candidate"]),
+            (2, 3, 3),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,240 @@
+"""Adaptive limit on in-flight tool calls, by additive increase and multiplicative decrease.
+
+A fixed concurrency either leaves the server idle or pushes it past the
+point where more calls in flight only add queueing. AdaptiveConcurrency
+adjusts the limit the way TCP adjusts its congestion window. Calls finish
+in windows of at least one limit's worth. After each window:
+
+- If the window's p95 latency or error rate is over target, the limit is
+  multiplied by DECREASE.
+- Otherwise, if calls actually queued at the limit, it grows by one.
+- Otherwise the client was not using the limit, so it stays.
+
+A window only counts calls started since the last change, so calls sent at
+the old limit do not decide the new one. The trajectory of windows shows
+where the server's knee is. The knee is the limit that gave the most
+throughput over its windows, among limits whose windows were mostly within
+target.
+"""
+
+import asyncio
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from metrics import percentile
+
+DECREASE = 0.5
+MIN_WINDOW = 10
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on in-flight tool calls, driven by their p95 latency and error rate.
+
+    Args:
+        latency_target: p95 call latency to stay under, in seconds
+        error_target: Error rate to stay under (default: 1%)
+        initial: Starting limit
+        max_limit: Upper bound on the limit
+    """
+
+    def __init__(self, latency_target: float, error_target: float = 0.01, initial: int = 1, max_limit: int = 256):
+        self.latency_target = latency_target
+        self.error_target = error_target
+        self.max_limit = max_limit
+        self.limit = float(max(1, min(initial, max_limit)))
+        self.in_flight = 0
+        self.trajectory: list[dict[str, Any]] = []
+        self._waiters: deque[asyncio.Future] = deque()
+        self._generation = 0
+        self._window: list[tuple[float, bool]] = []
+        self._window_start = time.perf_counter()
+        # Calls finished in this window, including ones started at an earlier limit, for throughput.
+        self._completed = 0
+        self._queued = False
+
+    async def acquire(self) -> int:
+        """Wait for a free slot and take it; return the ticket to release it with."""
+        while self.in_flight >= int(self.limit):
+            self._queued = True
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Woken, then cancelled: pass the slot on.
+                    self._wake()
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                raise
+        self.in_flight += 1
+        return self._generation
+
+    def _wake(self):
+        """Wake as many waiters as there are free slots, in arrival order."""
+        for _ in range(max(0, int(self.limit) - self.in_flight)):
+            while self._waiters and self._waiters[0].done():
+                self._waiters.popleft()
+            if not self._waiters:
+                return
+            self._waiters.popleft().set_result(None)
+
+    def release(self, ticket: int, latency: float | None = None, error: bool = False):
+        """Free a slot, counting the call's latency and outcome toward the window.
+
+        Pass no latency for a slot that was taken but not used.
+        """
+        self.in_flight -= 1
+        if latency is not None:
+            self._completed += 1
+        if latency is not None and ticket == self._generation:
+            self._window.append((latency, error))
+            if len(self._window) >= max(MIN_WINDOW, int(self.limit)):
+                self._adjust()
+        self._wake()
+
+    async def run(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Await call() in a slot, timing it; exceptions count as errors."""
+        ticket = await self.acquire()
+        start = time.perf_counter()
+        error = False
+        try:
+            return await call()
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.release(ticket, time.perf_counter() - start, error)
+
+    def _adjust(self):
+        now = time.perf_counter()
+        latencies = sorted(latency for latency, _ in self._window)
+        p95 = percentile(latencies, 95)
+        error_rate = sum(error for _, error in self._window) / len(self._window)
+        within_target = p95 <= self.latency_target and error_rate <= self.error_target
+        before = self.limit
+        if not within_target:
+            self.limit = max(1.0, self.limit * DECREASE)
+            decision = "decrease"
+        elif self._queued and self.limit < self.max_limit:
+            self.limit = min(float(self.max_limit), self.limit + 1)
+            decision = "increase"
+        else:
+            decision = "hold"
+        self.trajectory.append({
+            "t": now,
+            "limit": int(before),
+            "calls": len(self._window),
+            "completed": self._completed,
+            "duration": now - self._window_start,
+            "throughput": self._completed / (now - self._window_start) if now > self._window_start else 0.0,
+            "p95": p95,
+            "error_rate": error_rate,
+            "within_target": within_target,
+            "decision": decision,
+            "new_limit": int(self.limit),
+        })
+        if int(self.limit) != int(before):
+            self._generation += 1
+        self._window = []
+        self._window_start = now
+        self._completed = 0
+        self._queued = self.in_flight >= int(self.limit)
+
+    def stats(self, since: float | None = None) -> dict[str, Any]:
+        """Targets, current limit, knee and the trajectory of windows since the given perf_counter time."""
+        windows = [window for window in self.trajectory if since is None or window["t"] >= since]
+        levels = {}
+        for window in windows:
+            level = levels.setdefault(window["limit"], {"windows": 0, "completed": 0, "duration": 0.0, "within_target": 0, "p95": []})
+            level["windows"] += 1
+            level["completed"] += window["completed"]
+            level["duration"] += window["duration"]
+            level["within_target"] += window["within_target"]
+            level["p95"].append(window["p95"])
+        levels = [
+            {
+                "limit": limit,
+                "windows": level["windows"],
+                "throughput": level["completed"] / level["duration"] if level["duration"] else 0.0,
+                "p95": percentile(sorted(level["p95"]), 50),
+                "within_target": level["within_target"] / level["windows"],
+            }
+            for limit, level in sorted(levels.items())
+        ]
+        # Over windows at the same limit, so one lucky window does not make the knee.
+        knee = max((level for level in levels if level["within_target"] >= 0.5), key=lambda level: level["throughput"], default=None)
+        start = since if since is not None else (windows[0]["t"] if windows else 0.0)
+        return {
+            "latency_target": self.latency_target,
+            "error_target": self.error_target,
+            "max_limit": self.max_limit,
+            "limit": int(self.limit),
+            "increases": sum(window["decision"] == "increase" for window in windows),
+            "decreases": sum(window["decision"] == "decrease" for window in windows),
+            "knee": knee,
+            "levels": levels,
+            "trajectory": [{**window, "t": window["t"] - start} for window in windows],
+        }
+
+
+def summary_line(stats: dict[str, Any]) -> str:
+    """One-line summary of AdaptiveConcurrency.stats() for a report's summary list."""
+    knee = stats["knee"]
+    knee_note = f"knee at {knee['limit']} ({knee['throughput']:.1f} calls/s, p95 {knee['p95']:.3f}s)" if knee else "no window within target"
+    return f"limit {stats['limit']} after {stats['increases']} increases and {stats['decreases']} decreases, {knee_note}"
+
+
+CONCURRENCY_SECTION = """
+## Adaptive Concurrency
+
+In-flight tool calls were limited adaptively: after each window of calls, the limit grew by one if calls were queuing at it while p95 latency stayed under {latency_target:.3f}s and the error rate under {error_target:.1%}, and was halved if not. {knee} {increases} increases and {decreases} decreases; the limit ended at {limit}.
+
+Throughput by limit, over all windows at that limit:
+
+| Limit | Windows | Calls/s | Median p95 (s) | Within Target |
+|-------|---------|---------|----------------|---------------|
+{level_rows}
+
+Trajectory of windows:{sampled}
+
+| Time (s) | Limit | Calls | Calls/s | p95 (s) | Errors | Decision |
+|----------|-------|-------|---------|---------|--------|----------|
+{rows}
+"""
+
+MAX_ROWS = 40
+
+
+def concurrency_section(stats: dict[str, Any]) -> str:
+    """Render AdaptiveConcurrency.stats() as a Markdown report section."""
+    windows = stats["trajectory"]
+    shown = windows
+    if len(windows) > MAX_ROWS:
+        step = len(windows) / MAX_ROWS
+        shown = [windows[int(i * step)] for i in range(MAX_ROWS)]
+    knee = stats["knee"]
+    return CONCURRENCY_SECTION.format(
+        latency_target=stats["latency_target"],
+        error_target=stats["error_target"],
+        knee=(
+            f"**Knee**: {knee['limit']} concurrent calls gave the most throughput while mostly within target, "
+            f"{knee['throughput']:.1f} calls/s at a median window p95 of {knee['p95']:.3f}s."
+            if knee else "No limit stayed mostly within target."
+        ),
+        increases=stats["increases"],
+        decreases=stats["decreases"],
+        limit=stats["limit"],
+        level_rows="\n".join(
+            f"| {level['limit']} | {level['windows']} | {level['throughput']:.1f} | {level['p95']:.3f} | {level['within_target']:.0%} |"
+            for level in stats["levels"]
+        ) or "| _no complete windows_ | | | | |",
+        sampled=f" {len(shown)} of {len(windows)} are shown; the metrics JSON has all of them." if shown is not windows else "",
+        rows="\n".join(
+            f"| {window['t']:.1f} | {window['limit']} | {window['calls']} | {window['throughput']:.1f} | "
+            f"{window['p95']:.3f} | {window['error_rate']:.1%} | {window['decision']} |"
+            for window in shown
+        ) or "| _no complete windows_ | | | | | | |",
+    )
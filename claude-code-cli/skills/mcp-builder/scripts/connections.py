@@ -1,7 +1,17 @@
 """Lightweight connection handling for MCP servers."""
 
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterable
 from contextlib import AsyncExitStack
+from functools import partial
+from pathlib import Path
 from typing import Any
 
 from mcp import ClientSession, StdioServerParameters
@@ -9,6 +19,154 @@ from mcp.client.sse import sse_client
 from mcp.client.stdio import stdio_client
 from mcp.client.streamable_http import streamablehttp_client
 
+from metrics import latency_summary
+
+# Seconds a closing pool waits for a member to disconnect before cancelling it.
+CLOSE_TIMEOUT = 5.0
+
+
+class ToolError(Exception):
+    """A tool call that the server answered with an error result."""
+
+
+class _ErrorResult(Exception):
+    """Carries an error result out of ToolResultCache.get_or_call, so it is not stored."""
+
+    def __init__(self, content: Any):
+        super().__init__()
+        self.content = content
+
+
+class ToolResultCache:
+    """LRU cache of results for idempotent (read-only) tools.
+
+    Only tools on the allow-list are cached. Entries are keyed by tool name
+    plus canonicalized arguments and expire after ttl seconds if set.
+    Concurrent calls with the same key share a single in-flight request.
+    """
+
+    def __init__(self, tools: Iterable[str], max_entries: int = 1024, ttl: float | None = None):
+        self.tools = set(tools)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._pending: dict[str, asyncio.Future] = {}
+
+    def key(self, tool_name: str, arguments: dict[str, Any]) -> str | None:
+        """Return the cache key for a call, or None if the tool is not cacheable."""
+        if tool_name not in self.tools:
+            return None
+        return tool_name + ":" + json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=str)
+
+    async def get_or_call(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached result for key, calling the tool on a miss."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, result = entry
+            if self.ttl is None or time.monotonic() - stored_at < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            del self._entries[key]
+
+        pending = self._pending.get(key)
+        if pending is None:
+            self.misses += 1
+            pending = asyncio.ensure_future(call())
+            self._pending[key] = pending
+            pending.add_done_callback(lambda future: self._store(key, future))
+        else:
+            self.hits += 1
+        return await asyncio.shield(pending)
+
+    def _store(self, key: str, future: asyncio.Future):
+        self._pending.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._entries[key] = (time.monotonic(), future.result())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        """Return hit/miss counters and the current number of entries."""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+class ToolSchemaCache:
+    """On-disk cache of tool definitions, shared across runs and eval files.
+
+    Entries are keyed by the connection's identity (transport plus command,
+    args and environment, or URL) and are only reused while the live server
+    reports the same name and version during the handshake and its code on
+    disk is unchanged. Servers that report no version are never served from
+    the cache. With refresh, every lookup misses and entries are rewritten.
+    """
+
+    def __init__(self, path: Path, refresh: bool = False):
+        self.path = Path(path)
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        try:
+            self._entries = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            self._entries = {}
+
+    @staticmethod
+    def _key(identity: dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(identity, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(
+        self,
+        identity: dict[str, Any],
+        server_info: dict[str, Any],
+        fingerprint: dict[str, Any] | None = None,
+    ) -> list[dict[str, Any]] | None:
+        """Return cached tools if the server still reports the same version and its files are unchanged."""
+        entry = self._entries.get(self._key(identity))
+        if (
+            self.refresh
+            or entry is None
+            or not server_info.get("version")
+            or entry["server_info"] != server_info
+            or entry.get("fingerprint", {}) != (fingerprint or {})
+        ):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["tools"]
+
+    def idempotent_tools(self, identity: dict[str, Any]) -> list[str]:
+        """Names of the cached server's tools annotated as read-only or idempotent."""
+        entry = self._entries.get(self._key(identity))
+        return entry.get("idempotent", []) if entry else []
+
+    def put(
+        self,
+        identity: dict[str, Any],
+        server_info: dict[str, Any],
+        tools: list[dict[str, Any]],
+        idempotent: Iterable[str] = (),
+        fingerprint: dict[str, Any] | None = None,
+    ):
+        """Store tools (and which of them are idempotent) for a server and write the cache file atomically."""
+        if not server_info.get("version"):
+            return
+        self._entries[self._key(identity)] = {
+            "identity": identity,
+            "server_info": server_info,
+            "fingerprint": fingerprint or {},
+            "tools": tools,
+            "idempotent": sorted(idempotent),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(self._entries))
+        os.replace(tmp_path, self.path)
+
 
 class MCPConnection(ABC):
     """Base class for MCP server connections."""
@@ -16,11 +174,34 @@ class MCPConnection(ABC):
     def __init__(self):
         self.session = None
         self._stack = None
+        self.tool_cache: ToolResultCache | None = None
+        # concurrency.AdaptiveConcurrency limiting in-flight calls, if adaptive.
+        self.concurrency = None
+        self.schema_cache: ToolSchemaCache | None = None
+        self.call_timeout: float | None = None
+        # Raise ToolError for error results instead of returning their content.
+        self.raise_tool_errors = False
+        # profiling.ServerProfile logging this connection's tool calls, if profiled.
+        self.profile = None
+        self.server_info: dict[str, Any] = {}
+        # Seconds session.initialize took on the last connect.
+        self.handshake_s: float | None = None
+        # Tools the server annotates as read-only or idempotent, known once tools are listed.
+        self.idempotent_tools: set[str] = set()
+        self._tools: list[dict[str, Any]] | None = None
 
     @abstractmethod
     def _create_context(self):
         """Create the connection context based on connection type."""
 
+    @abstractmethod
+    def identity(self) -> dict[str, Any]:
+        """Describe the server this connection talks to, without secrets."""
+
+    def fingerprint(self) -> dict[str, Any]:
+        """Describe the server's code on disk, so cached tools are dropped when it changes."""
+        return {}
+
     async def __aenter__(self):
         """Initialize MCP server connection."""
         self._stack = AsyncExitStack()
@@ -39,7 +220,15 @@ class MCPConnection(ABC):
 
             session_ctx = ClientSession(read, write)
             self.session = await self._stack.enter_async_context(session_ctx)
-            await self.session.initialize()
+            handshake_start = time.perf_counter()
+            init_result = await self.session.initialize()
+            self.handshake_s = time.perf_counter() - handshake_start
+            self.server_info = {
+                "name": init_result.serverInfo.name,
+                "version": init_result.serverInfo.version,
+                "protocol_version": init_result.protocolVersion,
+            }
+            self._tools = None
             return self
         except BaseException:
             await self._stack.__aexit__(None, None, None)
@@ -53,8 +242,27 @@ class MCPConnection(ABC):
         self._stack = None
 
     async def list_tools(self) -> list[dict[str, Any]]:
-        """Retrieve available tools from the MCP server."""
+        """Retrieve available tools, reusing them for the session and from the schema cache."""
+        if self._tools is None:
+            tools = None
+            if self.schema_cache is not None:
+                tools = self.schema_cache.get(self.identity(), self.server_info, self.fingerprint())
+                if tools is not None:
+                    self.idempotent_tools = set(self.schema_cache.idempotent_tools(self.identity()))
+            if tools is None:
+                tools = await self._list_tools()
+                if self.schema_cache is not None:
+                    self.schema_cache.put(self.identity(), self.server_info, tools, self.idempotent_tools, self.fingerprint())
+            self._tools = tools
+        return self._tools
+
+    async def _list_tools(self) -> list[dict[str, Any]]:
         response = await self.session.list_tools()
+        self.idempotent_tools = {
+            tool.name
+            for tool in response.tools
+            if tool.annotations is not None and (tool.annotations.readOnlyHint or tool.annotations.idempotentHint)
+        }
         return [
             {
                 "name": tool.name,
@@ -64,9 +272,38 @@ class MCPConnection(ABC):
             for tool in response.tools
         ]
 
+    def is_idempotent(self, tool_name: str) -> bool:
+        """Whether a call may safely be made more than once, or in vain."""
+        return tool_name in self.idempotent_tools or (self.tool_cache is not None and tool_name in self.tool_cache.tools)
+
     async def call_tool(self, tool_name: str, arguments: dict[str, Any]) -> Any:
         """Call a tool on the MCP server with provided arguments."""
-        result = await self.session.call_tool(tool_name, arguments=arguments)
+        key = self.tool_cache.key(tool_name, arguments) if self.tool_cache else None
+        call = partial(self._call_tool, tool_name, arguments, key is not None)
+        if self.concurrency is not None:
+            call = partial(self.concurrency.run, call)
+        if key is None:
+            return await call()
+        try:
+            return await self.tool_cache.get_or_call(key, call)
+        except _ErrorResult as e:
+            return e.content
+
+    async def _call_tool(self, tool_name: str, arguments: dict[str, Any], cached: bool = False) -> Any:
+        started = time.time()
+        try:
+            result = await asyncio.wait_for(self.session.call_tool(tool_name, arguments=arguments), self.call_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Tool call timed out after {self.call_timeout}s") from None
+        finally:
+            if self.profile is not None:
+                # Wall-clock time, as the server's profiler samples use.
+                self.profile.record_call(tool_name, started, time.time())
+        if result.isError and self.raise_tool_errors:
+            raise ToolError(" ".join(getattr(block, "text", "") for block in result.content).strip())
+        if result.isError and cached:
+            # Returned to the caller but not stored, so a transient error is retried on the next call.
+            raise _ErrorResult(result.content)
         return result.content
 
 
@@ -80,10 +317,37 @@ class MCPConnectionStdio(MCPConnection):
         self.env = env
 
     def _create_context(self):
+        args = self.profile.launch_args(self.args) if self.profile is not None else self.args
         return stdio_client(
-            StdioServerParameters(command=self.command, args=self.args, env=self.env)
+            StdioServerParameters(command=self.command, args=args, env=self.env)
         )
 
+    def identity(self) -> dict[str, Any]:
+        identity = {"transport": "stdio", "command": self.command, "args": self.args}
+        if self.env:
+            # A digest only, since the environment may hold secrets.
+            identity["env"] = hashlib.sha256(json.dumps(self.env, sort_keys=True).encode("utf-8")).hexdigest()
+        return identity
+
+    def fingerprint(self) -> dict[str, Any]:
+        """Modification time and size of each script or module (after -m) named in args."""
+        fingerprint = {}
+        for i, arg in enumerate(self.args):
+            if i and self.args[i - 1] == "-m":
+                module = Path(*arg.split("."))
+                candidates = [module.with_suffix(".py"), module / "__main__.py"]
+            else:
+                candidates = [Path(arg)]
+            for path in candidates:
+                try:
+                    if path.is_file():
+                        stat = path.stat()
+                        fingerprint[str(path.resolve())] = [stat.st_mtime_ns, stat.st_size]
+                        break
+                except (OSError, ValueError):
+                    pass
+        return fingerprint
+
 
 class MCPConnectionSSE(MCPConnection):
     """MCP connection using Server-Sent Events."""
@@ -96,6 +360,9 @@ class MCPConnectionSSE(MCPConnection):
     def _create_context(self):
         return sse_client(url=self.url, headers=self.headers)
 
+    def identity(self) -> dict[str, Any]:
+        return {"transport": "sse", "url": self.url}
+
 
 class MCPConnectionHTTP(MCPConnection):
     """MCP connection using Streamable HTTP."""
@@ -108,6 +375,230 @@ class MCPConnectionHTTP(MCPConnection):
     def _create_context(self):
         return streamablehttp_client(url=self.url, headers=self.headers)
 
+    def identity(self) -> dict[str, Any]:
+        return {"transport": "http", "url": self.url}
+
+
+class _PoolMember:
+    """One slot of an MCPConnectionPool, owned by its own supervisor task."""
+
+    def __init__(self):
+        self.connection: MCPConnection | None = None
+        self.in_flight = 0
+        self.restarts = 0
+        # Consecutive failed connection attempts, for backoff.
+        self.failures = 0
+        self.wake = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.connection is not None and not self.wake.is_set()
+
+
+class MCPConnectionPool:
+    """Pool of MCP connections with least-busy dispatch.
+
+    For stdio each member is a separate server process; for sse/http each
+    member is an independent session. Every member is opened and closed by
+    its own supervisor task (the MCP transports must be exited from the task
+    that entered them), which reopens it whenever it fails, backing off
+    exponentially while it keeps failing. A background health check pings
+    every member, busy or idle, and restarts those that do not answer, as
+    does a call that times out. Calls wait up to reconnect_timeout for a
+    healthy member; the default covers a reconnect attempt at the longest
+    backoff.
+
+    A pool of one is how a single connection survives server crashes and
+    dropped streams. A call that fails because its member died is retried,
+    once the pool has reconnected, if the tool is idempotent: annotated as
+    read-only or idempotent by the server, or allowed by the tool cache.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], MCPConnection],
+        size: int,
+        health_check_interval: float = 30.0,
+        health_check_timeout: float = 10.0,
+        call_retries: int = 2,
+        base_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        reconnect_timeout: float | None = None,
+    ):
+        self.factory = factory
+        self.size = size
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.call_retries = call_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.reconnect_timeout = reconnect_timeout if reconnect_timeout is not None else 2 * max_backoff
+        self.tool_cache: ToolResultCache | None = None
+        self.concurrency = None
+        self.idempotent_tools: set[str] = set()
+        self.members: list[_PoolMember] = []
+        self.handshakes: list[float] = []
+        self.retried_calls = 0
+        self._closing = False
+        self._health_task: asyncio.Task | None = None
+
+    async def __aenter__(self):
+        """Start all pool members and wait until each is connected."""
+        self._closing = False
+        self.members = [_PoolMember() for _ in range(self.size)]
+        loop = asyncio.get_running_loop()
+        started = [loop.create_future() for _ in self.members]
+        for member, ready in zip(self.members, started):
+            member.task = asyncio.create_task(self._supervise(member, ready))
+
+        try:
+            await asyncio.gather(*started)
+        except BaseException:
+            # One member failed to connect: stop the others, even mid-handshake.
+            self._closing = True
+            for member in self.members:
+                member.task.cancel()
+            await asyncio.gather(*(member.task for member in self.members), return_exceptions=True)
+            raise
+
+        self._health_task = asyncio.create_task(self._health_check())
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Stop the health check and close every member."""
+        self._closing = True
+        if self._health_task:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        for member in self.members:
+            member.wake.set()
+        tasks = [member.task for member in self.members if member.task]
+        if tasks:
+            # A member stuck connecting, e.g. in a handshake that never answers, is cancelled.
+            _, pending = await asyncio.wait(tasks, timeout=CLOSE_TIMEOUT)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _supervise(self, member: _PoolMember, ready: asyncio.Future):
+        """Keep one member connected until the pool closes."""
+        while not self._closing:
+            # Cleared before connecting, so a close signalled meanwhile is not lost.
+            member.wake.clear()
+            try:
+                async with self.factory() as connection:
+                    self.handshakes.append(connection.handshake_s)
+                    member.failures = 0
+                    member.connection = connection
+                    if not ready.done():
+                        ready.set_result(None)
+                    if not self._closing:
+                        await member.wake.wait()
+            except Exception as e:
+                if not ready.done():
+                    ready.set_exception(e)
+                    return
+                # Back off, with jitter, while the server keeps failing to start.
+                delay = min(self.max_backoff, self.base_backoff * 2**member.failures)
+                member.failures += 1
+                try:
+                    # Cut short when the pool closes.
+                    await asyncio.wait_for(member.wake.wait(), random.uniform(delay / 2, delay))
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                member.connection = None
+            if not self._closing:
+                member.restarts += 1
+
+    async def _health_check(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            # Busy members too: a server hung under load would otherwise never be restarted.
+            await asyncio.gather(*(self._check(member) for member in self.members))
+
+    async def _check(self, member: _PoolMember) -> bool:
+        """Ping a member and restart it if it does not answer; return whether it answered."""
+        connection = member.connection
+        if connection is None or member.wake.is_set():
+            return False
+        try:
+            await asyncio.wait_for(connection.session.send_ping(), self.health_check_timeout)
+            return True
+        except Exception:
+            if member.connection is connection:
+                member.wake.set()
+            return False
+
+    async def _acquire(self) -> _PoolMember:
+        """Return the healthy member with the fewest in-flight calls, waiting up to reconnect_timeout for one."""
+        deadline = time.monotonic() + self.reconnect_timeout
+        while True:
+            healthy = [member for member in self.members if member.healthy]
+            if healthy:
+                return min(healthy, key=lambda member: member.in_flight)
+            if time.monotonic() >= deadline:
+                raise RuntimeError("No healthy MCP connections available in pool")
+            await asyncio.sleep(0.1)
+
+    async def list_tools(self) -> list[dict[str, Any]]:
+        """Retrieve available tools from the least busy member."""
+        member = await self._acquire()
+        tools = await member.connection.list_tools()
+        self.idempotent_tools |= member.connection.idempotent_tools
+        return tools
+
+    def is_idempotent(self, tool_name: str) -> bool:
+        """Whether a call may safely be made more than once, e.g. again after its member died."""
+        return tool_name in self.idempotent_tools or (self.tool_cache is not None and tool_name in self.tool_cache.tools)
+
+    async def call_tool(self, tool_name: str, arguments: dict[str, Any]) -> Any:
+        """Call a tool on the least busy member."""
+        key = self.tool_cache.key(tool_name, arguments) if self.tool_cache else None
+        call = partial(self._call_tool, tool_name, arguments, key is not None)
+        if self.concurrency is not None:
+            call = partial(self.concurrency.run, call)
+        if key is None:
+            return await call()
+        try:
+            return await self.tool_cache.get_or_call(key, call)
+        except _ErrorResult as e:
+            return e.content
+
+    async def _call_tool(self, tool_name: str, arguments: dict[str, Any], cached: bool = False) -> Any:
+        for attempt in range(self.call_retries + 1):
+            member = await self._acquire()
+            member.in_flight += 1
+            try:
+                # Members have no cache or limit of their own.
+                return await member.connection._call_tool(tool_name, arguments, cached)
+            except (ToolError, _ErrorResult):
+                raise
+            except TimeoutError:
+                # Not retried, but a member that stopped answering is restarted.
+                await self._check(member)
+                raise
+            except Exception:
+                # Tool errors come back as results; an exception may mean the member died.
+                if await self._check(member) or attempt == self.call_retries or not self.is_idempotent(tool_name):
+                    raise
+                self.retried_calls += 1
+            finally:
+                member.in_flight -= 1
+
+    def stats(self) -> dict[str, Any]:
+        """Return per-member load, reconnect and retry counters and handshake times."""
+        return {
+            "size": self.size,
+            "healthy": sum(member.healthy for member in self.members),
+            "in_flight": [member.in_flight for member in self.members],
+            "restarts": sum(member.restarts for member in self.members),
+            "retried_calls": self.retried_calls,
+            "handshake": latency_summary(self.handshakes),
+        }
+
 
 def create_connection(
     transport: str,
@@ -116,7 +607,17 @@ def create_connection(
     env: dict[str, str] = None,
     url: str = None,
     headers: dict[str, str] = None,
-) -> MCPConnection:
+    tool_cache: ToolResultCache = None,
+    pool_size: int = 1,
+    schema_cache: ToolSchemaCache = None,
+    call_timeout: float = None,
+    raise_tool_errors: bool = False,
+    profiler: Any = None,
+    reconnect: bool = True,
+    call_retries: int = 2,
+    concurrency: Any = None,
+    reconnect_timeout: float = None,
+) -> MCPConnection | MCPConnectionPool:
     """Factory function to create the appropriate MCP connection.
 
     Args:
@@ -126,26 +627,65 @@ def create_connection(
         env: Environment variables (stdio only)
         url: Server URL (sse and http only)
         headers: HTTP headers (sse and http only)
+        tool_cache: Optional result cache for idempotent tools
+        pool_size: Number of server processes (stdio) or sessions (sse/http)
+        schema_cache: Optional on-disk cache of tool definitions
+        call_timeout: Seconds before a single tool call is cancelled (default: no limit)
+        raise_tool_errors: Raise ToolError for error results instead of returning them
+        profiler: Optional profiling.ServerProfiler; every server process is
+            launched under it (Python stdio servers only)
+        reconnect: Reconnect after the server crashes or the stream drops,
+            by wrapping even a single connection in an MCPConnectionPool
+        call_retries: Retries of an idempotent call whose connection died
+        concurrency: Optional concurrency.AdaptiveConcurrency limiting
+            in-flight tool calls (cache hits bypass it)
+        reconnect_timeout: Seconds a call waits for a reconnecting server
+            before failing (default: twice the longest backoff, 60)
 
     Returns:
-        MCPConnection instance
+        MCPConnectionPool, or a bare MCPConnection if pool_size is 1 and
+        reconnect is off
     """
     transport = transport.lower()
 
     if transport == "stdio":
         if not command:
             raise ValueError("Command is required for stdio transport")
-        return MCPConnectionStdio(command=command, args=args, env=env)
+        factory = partial(MCPConnectionStdio, command=command, args=args, env=env)
 
     elif transport == "sse":
         if not url:
             raise ValueError("URL is required for sse transport")
-        return MCPConnectionSSE(url=url, headers=headers)
+        factory = partial(MCPConnectionSSE, url=url, headers=headers)
 
     elif transport in ["http", "streamable_http", "streamable-http"]:
         if not url:
             raise ValueError("URL is required for http transport")
-        return MCPConnectionHTTP(url=url, headers=headers)
+        factory = partial(MCPConnectionHTTP, url=url, headers=headers)
 
     else:
         raise ValueError(f"Unsupported transport type: {transport}. Use 'stdio', 'sse', or 'http'")
+
+    if pool_size < 1:
+        raise ValueError("pool_size must be at least 1")
+
+    if profiler is not None:
+        profiler.check(transport, command, args)
+
+    def build() -> MCPConnection:
+        member = factory()
+        member.schema_cache = schema_cache
+        member.call_timeout = call_timeout
+        member.raise_tool_errors = raise_tool_errors
+        if profiler is not None:
+            member.profile = profiler.new_profile()
+        return member
+
+    if pool_size > 1 or reconnect:
+        connection = MCPConnectionPool(build, pool_size, call_retries=call_retries, reconnect_timeout=reconnect_timeout)
+    else:
+        connection = build()
+    connection.tool_cache = tool_cache
+    connection.profiler = profiler
+    connection.concurrency = concurrency
+    return connection
@@ -5,18 +5,39 @@ This script evaluates MCP servers by running test questions against them using C
 
 import argparse
 import asyncio
+import heapq
+import itertools
 import json
+import multiprocessing
 import re
+import shlex
 import sys
+import tempfile
 import time
 import traceback
 import xml.etree.ElementTree as ET
+from collections.abc import Awaitable, Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AsyncExitStack, ExitStack
+from functools import partial
 from pathlib import Path
 from typing import Any
 
-from anthropic import Anthropic
-
-from connections import create_connection
+import httpx
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+from anthropic.types import Message
+
+from compaction import compact_messages, estimate_tokens
+from concurrency import AdaptiveConcurrency, concurrency_section, summary_line
+from connections import MCPConnectionPool, ToolResultCache, ToolSchemaCache, create_connection
+from metrics import CHARS_PER_TOKEN, TOKEN_FIELDS, RunMetrics, TaskMetrics, context_tokens
+from profiling import ServerProfiler, profile_section
+from rate_limit import RateLimiter
+from response_cache import CacheMiss, ResponseCache, ScopedResponseCache, request_key, to_jsonable
+from results import ResultSink
+from tool_trace import ToolTraceWriter
+from traces import TraceWriter
+from trials import merge_trials, run_trials
 
 EVALUATION_PROMPT = """You are an AI assistant with access to tools.
 
@@ -53,27 +74,44 @@ Response Requirements:
 - Your response should go last"""
 
 
-def parse_evaluation_file(file_path: Path) -> list[dict[str, Any]]:
-    """Parse XML evaluation file with qa_pair elements."""
-    try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        evaluations = []
-
-        for qa_pair in root.findall(".//qa_pair"):
-            question_elem = qa_pair.find("question")
-            answer_elem = qa_pair.find("answer")
-
-            if question_elem is not None and answer_elem is not None:
-                evaluations.append({
-                    "question": (question_elem.text or "").strip(),
-                    "answer": (answer_elem.text or "").strip(),
-                })
+def iter_evaluation_file(file_path: Path) -> Iterator[dict[str, Any]]:
+    """Stream qa_pair elements from an XML evaluation file.
 
-        return evaluations
+    Uses iterparse and clears each element once consumed, so the first pair
+    is available immediately and memory stays flat for very large files.
+    """
+    try:
+        depth = 0
+        root = None
+        for event, elem in ET.iterparse(file_path, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+
+            depth -= 1
+            if elem.tag == "qa_pair":
+                question_elem = elem.find("question")
+                answer_elem = elem.find("answer")
+
+                if question_elem is not None and answer_elem is not None:
+                    yield {
+                        "question": (question_elem.text or "").strip(),
+                        "answer": (answer_elem.text or "").strip(),
+                    }
+                elem.clear()
+            if depth == 1:
+                # Drop finished top-level subtrees so the root does not accumulate them.
+                root.clear()
     except Exception as e:
         print(f"Error parsing evaluation file {file_path}: {e}")
-        return []
+        raise
+
+
+def parse_evaluation_file(file_path: Path) -> list[dict[str, Any]]:
+    """Parse XML evaluation file with qa_pair elements."""
+    return list(iter_evaluation_file(file_path))
 
 
 def extract_xml_content(text: str, tag: str) -> str | None:
@@ -83,105 +121,388 @@ def extract_xml_content(text: str, tag: str) -> str | None:
     return matches[-1].strip() if matches else None
 
 
+# Result fields repeated in a trace's task summary record; per-turn detail is in its turn records.
+TRACE_TASK_FIELDS = (
+    "task_index", "status", "question", "expected", "actual", "score", "total_duration", "phases", "tokens", "num_tool_calls",
+)
+
+
+class TurnLimitExceeded(Exception):
+    """Raised when a task uses up its turn budget without a final answer."""
+
+
+class StreamInterrupted(Exception):
+    """Raised when a streamed response fails after some of its tool calls were started.
+
+    The request is not retried, as the retry could ask for different tool
+    calls while the started ones keep running.
+    """
+
+
+def create_client(
+    base_url: str | None = None,
+    max_connections: int = 100,
+    keepalive_expiry: float = 30.0,
+    max_retries: int = 2,
+) -> AsyncAnthropic:
+    """Create an async Anthropic client backed by a pooled HTTP connection.
+
+    Args:
+        base_url: API base URL; point it at a local stand-in server to
+            benchmark harness overhead offline (default: Anthropic API)
+        max_connections: Maximum number of pooled HTTP connections
+        keepalive_expiry: Seconds an idle connection is kept alive
+        max_retries: Retries the client makes on its own; set to 0 when a
+            RateLimiter handles retries
+
+    Returns:
+        AsyncAnthropic client
+    """
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+    )
+    return AsyncAnthropic(base_url=base_url, http_client=http_client, max_retries=max_retries)
+
+
+def build_request(model: str, messages: list[dict[str, Any]], tools: list[dict[str, Any]]) -> dict[str, Any]:
+    """Build the messages.create arguments for one agent turn."""
+    return {
+        "model": model,
+        "max_tokens": 4096,
+        "system": EVALUATION_PROMPT,
+        "messages": messages,
+        "tools": tools,
+    }
+
+
+async def stream_request(
+    client: AsyncAnthropic,
+    request: dict[str, Any],
+    on_tool_use: Callable[[Any], bool] | None = None,
+    metrics: TaskMetrics | None = None,
+) -> Any:
+    """Stream messages.create, handing each tool_use block to on_tool_use as soon as it is complete.
+
+    on_tool_use returns whether it started the tool call. Records into
+    metrics the seconds from sending the request to the first content delta
+    (its first token), to the first complete tool_use block, and from the
+    first started call to the end of the response (the head start it got).
+    Returns the final message, as messages.create would.
+    """
+    sent = time.perf_counter()
+    first_token = first_tool_use = first_started = None
+    try:
+        async with client.messages.stream(**request) as stream:
+            async for event in stream:
+                # content_block_start carries no generated content yet.
+                if first_token is None and event.type == "content_block_delta":
+                    first_token = time.perf_counter()
+                if event.type == "content_block_stop" and event.content_block.type == "tool_use":
+                    now = time.perf_counter()
+                    if first_tool_use is None:
+                        first_tool_use = now
+                    if on_tool_use is not None and on_tool_use(event.content_block) and first_started is None:
+                        first_started = now
+            response = await stream.get_final_message()
+    except Exception as e:
+        if first_started is not None:
+            raise StreamInterrupted(f"Response stream failed after tool calls were started: {e}") from e
+        raise
+    ended = time.perf_counter()
+    if metrics is not None:
+        metrics.record_stream(
+            (first_token or ended) - sent,
+            first_tool_use - sent if first_tool_use is not None else None,
+            ended - first_started if first_started is not None else None,
+        )
+    return response
+
+
+async def send_request(
+    client: AsyncAnthropic,
+    request: dict[str, Any],
+    rate_limiter: RateLimiter | None = None,
+    metrics: TaskMetrics | None = None,
+    stream: bool = False,
+    on_tool_use: Callable[[Any], bool] | None = None,
+) -> Any:
+    """Call messages.create, through the rate limiter if given, recording time spent queued into metrics.
+
+    With stream, the response is streamed through stream_request instead.
+    """
+    if stream:
+        send = partial(stream_request, client, request, on_tool_use, metrics)
+    else:
+        send = partial(client.messages.create, **request)
+    if rate_limiter is None:
+        return await send()
+    estimated_tokens = estimate_tokens(request["messages"]) + len(json.dumps(request["tools"])) // CHARS_PER_TOKEN
+    response, waited = await rate_limiter.run(send, estimated_tokens)
+    if metrics is not None:
+        metrics.record_queue(waited)
+    return response
+
+
+async def create_message(
+    client: AsyncAnthropic,
+    model: str,
+    messages: list[dict[str, Any]],
+    tools: list[dict[str, Any]],
+    response_cache: ResponseCache | None = None,
+    rate_limiter: RateLimiter | None = None,
+    metrics: TaskMetrics | None = None,
+    trial: int = 0,
+    stream: bool = False,
+    on_tool_use: Callable[[Any], bool] | None = None,
+) -> Any:
+    """Send one agent turn to the model, going through the response cache if given.
+
+    Only requests that actually reach the API go through rate_limiter.
+    Repeated trials of a question are cached separately, keyed by trial.
+    With stream, responses from the API are streamed and on_tool_use gets
+    each tool_use block as soon as it is complete; cached responses arrive
+    whole.
+    """
+    request = build_request(model, messages, tools)
+    if response_cache is None:
+        return await send_request(client, request, rate_limiter, metrics, stream, on_tool_use)
+
+    key = request_key({**request, "trial": trial} if trial else request)
+    if response_cache.mode != "record":
+        cached = response_cache.get(key)
+        if cached is not None:
+            return Message.model_validate(cached)
+        if response_cache.mode == "replay":
+            raise CacheMiss(f"No recorded response for request {key[:12]}")
+
+    response = await send_request(client, request, rate_limiter, metrics, stream, on_tool_use)
+    response_cache.put(key, response.model_dump(mode="json", exclude_none=True))
+    return response
+
+
+async def execute_tool(connection: Any, tool_use: Any) -> tuple[str, float]:
+    """Call the tool requested by a tool_use block.
+
+    Returns the serialized tool response and the call's own duration, so
+    calls that overlap with other tools in the same turn are timed correctly.
+    """
+    tool_start_ts = time.perf_counter()
+    try:
+        tool_result = await connection.call_tool(tool_use.name, tool_use.input)
+        tool_response = json.dumps(tool_result) if isinstance(tool_result, (dict, list)) else str(tool_result)
+    except Exception as e:
+        tool_response = f"Error executing tool {tool_use.name}: {str(e)}\n"
+        tool_response += traceback.format_exc()
+    return tool_response, time.perf_counter() - tool_start_ts
+
+
 async def agent_loop(
-    client: Anthropic,
+    client: AsyncAnthropic,
     model: str,
     question: str,
     tools: list[dict[str, Any]],
     connection: Any,
+    response_cache: ResponseCache | None = None,
+    metrics: TaskMetrics | None = None,
+    compaction: dict[str, int] | None = None,
+    max_turns: int | None = None,
+    on_tool_call: Callable[[dict[str, Any]], None] | None = None,
+    on_turn: Callable[[dict[str, Any]], None] | None = None,
+    rate_limiter: RateLimiter | None = None,
+    trial: int = 0,
+    stream: bool = False,
 ) -> tuple[str, dict[str, Any]]:
-    """Run the agent loop with MCP tools."""
+    """Run the agent loop with MCP tools, recording per-turn timings into metrics.
+
+    If compaction is given, its settings are passed to compact_messages after
+    each round of tool results to keep the re-sent context within budget.
+    Raises TurnLimitExceeded if the model still wants tools after max_turns.
+    on_tool_call, if given, receives a record of every tool call as it
+    finishes, and on_turn a record of every turn: the request hash, the
+    response, its tool calls and the turn's timings. Model requests go
+    through rate_limiter if given; trial tells repeated trials apart in the
+    response cache. With stream, responses are streamed and each call to an
+    idempotent tool starts as soon as its tool_use block is complete, while
+    the rest of the response is still being generated. Other tools wait for
+    the response, which may still stop for another reason, e.g. max_tokens.
+    """
+    metrics = metrics if metrics is not None else TaskMetrics()
     messages = [{"role": "user", "content": question}]
 
-    response = await asyncio.to_thread(
-        client.messages.create,
-        model=model,
-        max_tokens=4096,
-        system=EVALUATION_PROMPT,
-        messages=messages,
-        tools=tools,
-    )
-
-    messages.append({"role": "assistant", "content": response.content})
-
-    tool_metrics = {}
-
-    while response.stop_reason == "tool_use":
-        tool_use = next(block for block in response.content if block.type == "tool_use")
-        tool_name = tool_use.name
-        tool_input = tool_use.input
+    while True:
+        if max_turns is not None and len(metrics.turns) >= max_turns:
+            raise TurnLimitExceeded(f"No final answer after {max_turns} turns")
+        key = request_key(build_request(model, messages, tools)) if on_turn is not None else None
+        turn_start = time.perf_counter()
+        started: dict[str, asyncio.Task] = {}
+
+        def start_tool(tool_use: Any) -> bool:
+            # A call started early is cancelled if the response then stops for another reason,
+            # after its side effects may have happened, so only idempotent tools start early.
+            if not connection.is_idempotent(tool_use.name):
+                return False
+            started[tool_use.id] = asyncio.create_task(execute_tool(connection, tool_use))
+            return True
 
-        tool_start_ts = time.time()
         try:
-            tool_result = await connection.call_tool(tool_name, tool_input)
-            tool_response = json.dumps(tool_result) if isinstance(tool_result, (dict, list)) else str(tool_result)
-        except Exception as e:
-            tool_response = f"Error executing tool {tool_name}: {str(e)}\n"
-            tool_response += traceback.format_exc()
-        tool_duration = time.time() - tool_start_ts
-
-        if tool_name not in tool_metrics:
-            tool_metrics[tool_name] = {"count": 0, "durations": []}
-        tool_metrics[tool_name]["count"] += 1
-        tool_metrics[tool_name]["durations"].append(tool_duration)
-
-        messages.append({
-            "role": "user",
-            "content": [{
-                "type": "tool_result",
-                "tool_use_id": tool_use.id,
-                "content": tool_response,
-            }]
-        })
-
-        response = await asyncio.to_thread(
-            client.messages.create,
-            model=model,
-            max_tokens=4096,
-            system=EVALUATION_PROMPT,
-            messages=messages,
-            tools=tools,
-        )
+            response = await create_message(
+                client, model, messages, tools, response_cache, rate_limiter, metrics, trial,
+                stream, start_tool if stream else None,
+            )
+        except BaseException:
+            for task in started.values():
+                task.cancel()
+            raise
+        model_duration = time.perf_counter() - turn_start
+        tokens = metrics.record_usage(getattr(response, "usage", None))
         messages.append({"role": "assistant", "content": response.content})
 
+        tool_duration = 0.0
+        tool_uses = []
+        tool_calls = []
+        if response.stop_reason == "tool_use":
+            tool_uses = [block for block in response.content if block.type == "tool_use"]
+            tool_start = time.perf_counter()
+            # Tools already started while the response streamed are awaited, the rest started now.
+            outcomes = await asyncio.gather(*(
+                started.pop(tool_use.id, None) or execute_tool(connection, tool_use) for tool_use in tool_uses
+            ))
+            tool_duration = time.perf_counter() - tool_start
+
+            tool_results = []
+            for tool_use, (tool_response, call_duration) in zip(tool_uses, outcomes):
+                metrics.record_tool(tool_use.name, call_duration, len(tool_response))
+                tool_calls.append({
+                    "tool": tool_use.name,
+                    "arguments": tool_use.input,
+                    "duration_s": call_duration,
+                    "result_chars": len(tool_response),
+                    "error": tool_response.startswith(f"Error executing tool {tool_use.name}:"),
+                })
+                if on_tool_call is not None:
+                    on_tool_call(tool_calls[-1])
+                tool_results.append({
+                    "type": "tool_result",
+                    "tool_use_id": tool_use.id,
+                    "content": tool_response,
+                })
+
+            messages.append({"role": "user", "content": tool_results})
+            if compaction:
+                stats = compact_messages(messages, **compaction)
+                if stats:
+                    metrics.record_compaction(stats)
+
+        # Complete tool_use blocks of a response that then stopped for another reason.
+        for task in started.values():
+            task.cancel()
+        metrics.record_turn(model_duration, tool_duration, time.perf_counter() - turn_start, len(tool_uses), tokens)
+        if on_turn is not None:
+            on_turn({
+                "turn": len(metrics.turns) - 1,
+                "request_key": key,
+                "response": to_jsonable(response),
+                **metrics.turns[-1],
+                "tool_calls": tool_calls,
+            })
+        if response.stop_reason != "tool_use":
+            break
+
     response_text = next(
         (block.text for block in response.content if hasattr(block, "text")),
         None,
     )
-    return response_text, tool_metrics
+    return response_text, metrics.tool_calls
 
 
 async def evaluate_single_task(
-    client: Anthropic,
+    client: AsyncAnthropic,
     model: str,
     qa_pair: dict[str, Any],
     tools: list[dict[str, Any]],
     connection: Any,
     task_index: int,
+    log: Callable[[str], None] = print,
+    response_cache: ResponseCache | None = None,
+    compaction: dict[str, int] | None = None,
+    max_turns: int | None = None,
+    timeout: float | None = None,
+    tool_trace: ToolTraceWriter | None = None,
+    trace: TraceWriter | None = None,
+    rate_limiter: RateLimiter | None = None,
+    trial: int | None = None,
+    stream: bool = False,
 ) -> dict[str, Any]:
-    """Evaluate a single QA pair with the given tools."""
-    start_time = time.time()
-
-    print(f"Task {task_index + 1}: Running task with question: {qa_pair['question']}")
-    response, tool_metrics = await agent_loop(client, model, qa_pair["question"], tools, connection)
-
-    response_value = extract_xml_content(response, "response")
-    summary = extract_xml_content(response, "summary")
-    feedback = extract_xml_content(response, "feedback")
-
-    duration_seconds = time.time() - start_time
-
-    return {
+    """Evaluate a single QA pair with the given tools.
+
+    If the task runs longer than timeout seconds or exceeds max_turns, it is
+    cancelled and reported with status "timeout" or "max_turns" and the
+    metrics recorded up to that point. Tool calls are appended to tool_trace
+    if given, and every turn plus a final task summary to trace. With
+    trial, this is one of several trials of the question; its records and
+    result carry the trial number. stream is passed on to agent_loop.
+    """
+    start_time = time.perf_counter()
+    metrics = TaskMetrics()
+    status = "completed"
+    response = None
+    ids = {"task_index": task_index} if trial is None else {"task_index": task_index, "trial": trial}
+    label = f"Task {task_index + 1}" if trial is None else f"Task {task_index + 1} (trial {trial + 1})"
+
+    def on_tool_call(call: dict[str, Any]):
+        tool_trace.write({**ids, **call})
+
+    def on_turn(turn: dict[str, Any]):
+        trace.write({"kind": "turn", **ids, **turn})
+
+    log(f"{label}: Running task with question: {qa_pair['question']}")
+    try:
+        response, _ = await asyncio.wait_for(
+            agent_loop(
+                client, model, qa_pair["question"], tools, connection,
+                response_cache, metrics, compaction, max_turns,
+                on_tool_call if tool_trace else None, on_turn if trace else None, rate_limiter, trial or 0, stream,
+            ),
+            timeout,
+        )
+    except asyncio.TimeoutError:
+        status = "timeout"
+        log(f"{label}: ⏱️ Timed out after {timeout:.1f}s")
+    except TurnLimitExceeded as e:
+        status = "max_turns"
+        log(f"{label}: ⏱️ {e}")
+
+    response_value = extract_xml_content(response or "", "response")
+    summary = extract_xml_content(response or "", "summary")
+    feedback = extract_xml_content(response or "", "feedback")
+    tool_metrics = metrics.tool_calls
+
+    duration_seconds = time.perf_counter() - start_time
+
+    result = {
+        **ids,
+        "status": status,
         "question": qa_pair["question"],
         "expected": qa_pair["answer"],
         "actual": response_value,
         "score": int(response_value == qa_pair["answer"]) if response_value else 0,
         "total_duration": duration_seconds,
+        "phases": metrics.phase_totals(duration_seconds),
+        "turns": metrics.turns,
+        "tokens": metrics.tokens,
+        "compactions": metrics.compactions,
         "tool_calls": tool_metrics,
         "num_tool_calls": sum(len(metrics["durations"]) for metrics in tool_metrics.values()),
         "summary": summary,
         "feedback": feedback,
     }
+    if trace is not None:
+        trace.write({"kind": "task", **ids, **{field: result[field] for field in TRACE_TASK_FIELDS}})
+    return result
 
 
 REPORT_HEADER = """
@@ -190,13 +511,42 @@ REPORT_HEADER = """
 ## Summary
 
 - **Accuracy**: {correct}/{total} ({accuracy:.1f}%)
+- **Outcomes**: {outcomes}
 - **Average Task Duration**: {average_duration_s:.2f}s
 - **Average Tool Calls per Task**: {average_tool_calls:.2f}
 - **Total Tool Calls**: {total_tool_calls}
+- **Tokens**: {input_tokens} input ({cache_read_tokens} cache read, {cache_write_tokens} cache write), {output_tokens} output
+- **Throughput**: {tokens_per_second:.1f} tokens/s over {wall_time:.1f}s, {output_tokens_per_second:.1f} output tokens/s of model time
+- **Tokens per Task**: {tokens_per_task:.0f}
+- **Tokens per Correct Answer**: {tokens_per_correct}
+{extra_stats}
+## Latency
+
+Per-turn phases: **queue** is time waiting for the rate limiter or backing off after rejected requests (shown only if any), **model** is time waiting on the model, **tool** is wall time of a turn's tool calls (turns that called tools only), **overhead** is the rest of the turn spent in the harness. Streamed runs add time to the **first token** and to the **first tool use** (a complete tool_use block), and the **tool head start**: how long before the response ended its first tool call started; tool time then counts only what was left after the response.
+
+| Phase | Count | Mean | p50 | p90 | p99 | Max |
+|-------|-------|------|-----|-----|-----|-----|
+{latency_rows}
+
+| Tool | Calls | Mean | p50 | p90 | p99 | Max |
+|------|-------|------|-----|-----|-----|-----|
+{tool_latency_rows}
+
+## Tool Result Context
 
+Tokens each tool result adds to the conversation, which is re-sent on every later turn.
+
+| Tool | Calls | Total Tokens | Mean | Max | Share of Input |
+|------|-------|--------------|------|-----|----------------|
+{tool_token_rows}
+{extra_sections}
 ---
 """
 
+LATENCY_ROW = "| {name} | {count} | {mean:.3f}s | {p50:.3f}s | {p90:.3f}s | {p99:.3f}s | {max:.3f}s |"
+
+TOOL_TOKEN_ROW = "| `{name}` | {calls} | {total} | {mean:.0f} | {max} | {share_of_context:.1%} |"
+
 TASK_TEMPLATE = """
 ### Task {task_num}
 
@@ -204,7 +554,9 @@ TASK_TEMPLATE = """
 **Ground Truth Answer**: `{expected_answer}`
 **Actual Answer**: `{actual_answer}`
 **Correct**: {correct_indicator}
-**Duration**: {total_duration:.2f}s
+**Outcome**: {status}{trials_note}
+**Duration**: {total_duration:.2f}s ({queue_note}model {model_s:.2f}s, tools {tool_s:.2f}s, overhead {overhead_s:.2f}s over {num_turns} turns)
+**Tokens**: {input_tokens} input, {output_tokens} output{compaction_note}
 **Tool Calls**: {tool_calls}
 
 **Summary**
@@ -217,61 +569,802 @@ TASK_TEMPLATE = """
 """
 
 
+async def run_bounded(
+    items: Iterable[Any],
+    worker: Callable[[Any], Awaitable[Any]],
+    concurrency: int = 1,
+):
+    """Run worker(item) over items with at most `concurrency` in flight.
+
+    Items are pulled lazily, so a new task starts only when a slot frees up
+    and only in-flight tasks are held in memory. Workers are responsible for
+    storing their own results. If any task fails, the remaining ones are
+    cancelled and the error is raised.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    pending: set[asyncio.Task] = set()
+
+    async def guarded(item: Any):
+        try:
+            await worker(item)
+        finally:
+            semaphore.release()
+
+    try:
+        for item in items:
+            await semaphore.acquire()
+            done = {task for task in pending if task.done()}
+            pending -= done
+            for task in done:
+                task.result()
+            pending.add(asyncio.create_task(guarded(item)))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        raise
+
+
+def trials_note(result: dict[str, Any]) -> str:
+    """Describe a question's trials for its report section, if it was run with trials."""
+    trial_summary = result.get("trial_summary")
+    if not trial_summary:
+        return ""
+    low, high = trial_summary["pass_rate_ci"]
+    note = f" ({trial_summary['passes']}/{trial_summary['trials']} trials passed, 95% CI {low:.0%}–{high:.0%}"
+    if trial_summary["trials"] < trial_summary["max_trials"]:
+        note += f", settled after {trial_summary['trials']} of {trial_summary['max_trials']}"
+    return note + ")"
+
+
+def build_report(
+    results: Iterable[dict[str, Any]],
+    extra_stats: str = "",
+    run_metrics: RunMetrics | None = None,
+    extra_sections: str = "",
+) -> str:
+    """Build the Markdown report from task results ordered by task index.
+
+    Results are aggregated into run_metrics (a fresh RunMetrics if not given)
+    while the report is rendered, so callers can export the same numbers.
+    extra_sections is Markdown placed after the summary tables.
+    """
+    run_metrics = run_metrics if run_metrics is not None else RunMetrics()
+    sections = []
+    for result in results:
+        run_metrics.add(result)
+        phases = result.get("phases", {})
+        tokens = result.get("tokens", {})
+        compactions = result.get("compactions", [])
+        compaction_note = ""
+        if compactions:
+            saved = sum(stats["saved_tokens"] for stats in compactions)
+            compaction_note = f" (~{saved} tokens saved by {len(compactions)} compactions)"
+        sections.append(TASK_TEMPLATE.format(
+            task_num=result["task_index"] + 1,
+            question=result["question"],
+            expected_answer=result["expected"],
+            actual_answer=result["actual"] or "N/A",
+            correct_indicator="✅" if result["score"] >= 0.5 else "❌",
+            status=result.get("status", "completed"),
+            trials_note=trials_note(result),
+            total_duration=result["total_duration"],
+            queue_note=f"queued {phases['queue_s']:.2f}s, " if phases.get("queue_s") else "",
+            model_s=phases.get("model_s", 0.0),
+            tool_s=phases.get("tool_s", 0.0),
+            overhead_s=phases.get("overhead_s", 0.0),
+            num_turns=len(result.get("turns", [])),
+            input_tokens=context_tokens({field: tokens.get(field, 0) for field in TOKEN_FIELDS}),
+            output_tokens=tokens.get("output_tokens", 0),
+            compaction_note=compaction_note,
+            tool_calls=json.dumps(result["tool_calls"], indent=2),
+            summary=result["summary"] or "N/A",
+            feedback=result["feedback"] or "N/A",
+        ))
+
+    summary = run_metrics.to_dict()
+    count = summary["tasks"]
+    latency_rows = [LATENCY_ROW.format(name="task", **summary["task_duration"])]
+    latency_rows += [
+        LATENCY_ROW.format(name=phase, **stats)
+        for phase, stats in summary["phases"].items()
+        if phase != "queue" or stats["max"] > 0
+    ]
+    streaming = summary["streaming"]
+    if streaming:
+        latency_rows += [
+            LATENCY_ROW.format(name=name, **streaming[timing])
+            for timing, name in (("ttft", "first token"), ("first_tool_use", "first tool use"), ("head_start", "tool head start"))
+            if streaming[timing]["count"]
+        ]
+        head_start = streaming["head_start"]
+        extra_stats += (
+            f"- **Streaming**: first token after {streaming['ttft']['p50']:.3f}s (p50) of {streaming['ttft']['count']} streamed turns; "
+            f"tool calls started {head_start['mean'] * head_start['count']:.2f}s in total before their responses ended, "
+            f"in {head_start['count']} turns\n"
+        )
+    tool_latency_rows = [LATENCY_ROW.format(name=f"`{name}`", **stats) for name, stats in summary["tools"].items()]
+    token_summary = summary["tokens"]
+    tool_token_rows = [TOOL_TOKEN_ROW.format(name=name, **stats) for name, stats in token_summary["tool_results"].items()]
+    tokens_per_correct = token_summary["tokens_per_correct_answer"]
+    trial_stats = summary["trials"]
+    if trial_stats:
+        saved = 1 - trial_stats["trials_run"] / trial_stats["trials_budget"]
+        low, high = trial_stats["pass@1_ci"]
+        k = trial_stats["max_trials"]
+        extra_stats += (
+            f"- **Trials**: up to {k} per question, {trial_stats['trials_run']} of {trial_stats['trials_budget']} run "
+            f"({saved:.0%} saved by early stopping); pass@1 {trial_stats['pass@1']:.3f} (95% CI {low:.3f}–{high:.3f}), "
+            f"pass@{k} {trial_stats['pass@k']:.3f}, pass^{k} {trial_stats['pass^k']:.3f}\n"
+        )
+    compaction = token_summary["compaction"]
+    if compaction["passes"]:
+        extra_stats += (
+            f"- **Context Compaction**: {compaction['passes']} passes saved ~{compaction['saved_tokens']} tokens "
+            f"({compaction['superseded']} superseded, {compaction['truncated']} truncated results)\n"
+        )
+
+    report = REPORT_HEADER.format(
+        correct=f"{round(summary['correct'], 2):g}",
+        total=count,
+        accuracy=summary["accuracy"] * 100,
+        outcomes=", ".join(f"{count} {status}" for status, count in sorted(summary["statuses"].items())) or "N/A",
+        average_duration_s=summary["task_duration"]["mean"],
+        average_tool_calls=summary["total_tool_calls"] / count if count else 0,
+        total_tool_calls=summary["total_tool_calls"],
+        extra_stats=extra_stats,
+        latency_rows="\n".join(latency_rows),
+        tool_latency_rows="\n".join(tool_latency_rows) or "| _no tool calls_ | | | | | | |",
+        input_tokens=context_tokens(token_summary),
+        cache_read_tokens=token_summary["cache_read_input_tokens"],
+        cache_write_tokens=token_summary["cache_creation_input_tokens"],
+        output_tokens=token_summary["output_tokens"],
+        tokens_per_second=token_summary["tokens_per_second"],
+        wall_time=summary["wall_time"],
+        output_tokens_per_second=token_summary["output_tokens_per_model_second"],
+        tokens_per_task=token_summary["tokens_per_task"],
+        tokens_per_correct=f"{tokens_per_correct:.0f}" if tokens_per_correct is not None else "N/A",
+        tool_token_rows="\n".join(tool_token_rows) or "| _no tool calls_ | | | | | |",
+        extra_sections=extra_sections,
+    )
+    return report + "".join(sections)
+
+
 async def run_evaluation(
     eval_path: Path,
     connection: Any,
     model: str = "claude-3-7-sonnet-20250219",
+    concurrency: int = 1,
+    client: AsyncAnthropic | None = None,
+    response_cache: ResponseCache | None = None,
+    results_path: Path | None = None,
+    resume: bool = False,
+    metrics_path: Path | None = None,
+    compaction: dict[str, int] | None = None,
+    max_turns: int | None = None,
+    task_timeout: float | None = None,
+    deadline: float | None = None,
+    log: Callable[[str], None] = print,
+    run_metrics: RunMetrics | None = None,
+    tool_trace: ToolTraceWriter | None = None,
+    trace: TraceWriter | None = None,
+    rate_limiter: RateLimiter | None = None,
+    trials: int = 1,
+    early_stop: bool = True,
+    shard: tuple[int, int] | None = None,
+    stream: bool = False,
 ) -> str:
-    """Run evaluation with MCP server tools."""
-    print("🚀 Starting Evaluation")
-
-    client = Anthropic()
+    """Run evaluation with MCP server tools.
+
+    If results_path is given, each finished task is appended to it as a JSON
+    line and the report is built from that file. With resume, QA pairs that
+    already have a result there are skipped. If metrics_path is given, the
+    run's latency and token statistics are also written there as JSON.
+
+    Tasks are cancelled after task_timeout seconds or max_turns turns. Once
+    deadline seconds have passed since the start, in-flight tasks are
+    cancelled and reported as timed out, and the rest are not started.
+
+    Progress is written through log. The run's statistics are aggregated
+    into run_metrics (a fresh RunMetrics if not given). Every tool call is
+    appended to tool_trace if given, for replay with loadtest.py, and every
+    turn to trace. All model requests share rate_limiter if given. If the
+    connection has a profiler, the report gets a section with the server's
+    hot functions per tool during this run.
+
+    With trials > 1, each question is attempted up to that many times, in
+    parallel, and its result aggregates the trials. With early_stop, a
+    question stops being sampled once its outcome is statistically settled.
+
+    With shard=(index, count), only every count-th QA pair, starting at
+    index, is run; task indexes stay those of the whole file.
+
+    With stream, model responses are streamed: time to first token is
+    measured, and calls to idempotent tools start as soon as their tool_use
+    block is complete.
+    """
+    log("🚀 Starting Evaluation")
+    run_start = time.perf_counter()
+    # Wall clock, to match server profile samples.
+    profile_start = time.time()
+    deadline_at = run_start + deadline if deadline is not None else None
+
+    def time_left() -> float | None:
+        """Seconds a task starting now may run, given the task and run deadlines."""
+        limits = [task_timeout] if task_timeout is not None else []
+        if deadline_at is not None:
+            limits.append(deadline_at - time.perf_counter())
+        return max(0.0, min(limits)) if limits else None
+
+    client = client or create_client()
 
     tools = await connection.list_tools()
-    print(f"📋 Loaded {len(tools)} tools from MCP server")
+    log(f"📋 Loaded {len(tools)} tools from MCP server")
+
+    log(f"📋 Streaming evaluation tasks from {eval_path}")
+
+    with ResultSink(results_path, resume=resume) as sink:
+        if len(sink):
+            log(f"⏩ Resuming: {len(sink)} tasks already completed in {results_path}")
+
+        # Trials of all questions share the concurrency limit.
+        trial_slots = asyncio.Semaphore(max(1, concurrency))
+
+        async def run_task(i: int, qa_pair: dict[str, Any]):
+            def evaluate(task_log: Callable[[str], None], trial: int | None = None) -> Awaitable[dict[str, Any]]:
+                return evaluate_single_task(
+                    client, model, qa_pair, tools, connection, i,
+                    log=task_log, response_cache=response_cache, compaction=compaction,
+                    max_turns=max_turns, timeout=time_left(), tool_trace=tool_trace, trace=trace,
+                    rate_limiter=rate_limiter, trial=trial, stream=stream,
+                )
+
+            if concurrency <= 1 and trials <= 1:
+                log(f"Processing task {i + 1}")
+                sink.write(await evaluate(log))
+                return
+
+            # Buffer each task's log lines and flush them as one block when it
+            # finishes, so output from concurrently running tasks never interleaves.
+            lines = [f"Processing task {i + 1}"]
+            try:
+                if trials > 1:
+                    async def run_trial(trial: int) -> dict[str, Any]:
+                        async with trial_slots:
+                            return await evaluate(lines.append, trial)
+
+                    result = merge_trials(await run_trials(run_trial, trials, early_stop), trials)
+                    trial_summary = result["trial_summary"]
+                    outcome = f"{trial_summary['passes']}/{trial_summary['trials']} trials passed"
+                else:
+                    result = await evaluate(lines.append)
+                    outcome = "✅" if result["score"] else "❌"
+                lines.append(f"Task {i + 1}: {outcome} in {result['total_duration']:.2f}s")
+                sink.write(result)
+            finally:
+                log("\n".join(lines))
+
+        if concurrency > 1:
+            log(f"⚡ Running up to {concurrency} tasks concurrently")
+        if trials > 1:
+            log(f"🔁 Running up to {trials} trials per question{', stopping early once settled' if early_stop else ''}")
+        remaining = (
+            (i, qa_pair)
+            for i, qa_pair in enumerate(iter_evaluation_file(eval_path))
+            if (shard is None or i % shard[1] == shard[0]) and not sink.is_done(i, qa_pair["question"])
+        )
+        if deadline_at is not None:
+            remaining = itertools.takewhile(lambda _: time.perf_counter() < deadline_at, remaining)
+        await run_bounded(remaining, lambda task: run_task(*task), concurrency)
+        log(f"📋 Completed {len(sink)} evaluation tasks")
+        if deadline_at is not None and time.perf_counter() >= deadline_at:
+            log(f"⏱️ Run deadline of {deadline:g}s reached; remaining tasks were not started")
+
+        extra_stats = ""
+        if response_cache is not None:
+            log(f"💾 Response cache ({response_cache.mode}): {response_cache.hits} hits, {response_cache.misses} misses")
+            extra_stats += f"- **Response Cache ({response_cache.mode})**: {response_cache.hits} hits, {response_cache.misses} misses\n"
+        if rate_limiter is not None:
+            limiter_stats = rate_limiter.stats()
+            budgets = [
+                f"{limiter_stats[field]:g} {unit}"
+                for field, unit in (("requests_per_minute", "requests/min"), ("tokens_per_minute", "tokens/min"))
+                if limiter_stats[field]
+            ]
+            if budgets or limiter_stats["retries"]:
+                queue_delay = limiter_stats["queue_delay"]
+                line = (
+                    f"{' and '.join(budgets) or 'no budget'}, {limiter_stats['rate_limited']} rate-limited responses, "
+                    f"{limiter_stats['retries']} retries, queue delay p50 {queue_delay['p50']:.2f}s p99 {queue_delay['p99']:.2f}s"
+                )
+                log(f"🚦 Rate limiter: {line}")
+                extra_stats += f"- **Rate Limiter**: {line}\n"
+        tool_cache = getattr(connection, "tool_cache", None)
+        if tool_cache is not None:
+            lookups = tool_cache.hits + tool_cache.misses
+            hit_rate = tool_cache.hits / lookups * 100 if lookups else 0
+            log(f"💾 Tool cache: {tool_cache.hits} hits, {tool_cache.misses} misses")
+            extra_stats += f"- **Tool Cache**: {tool_cache.hits} hits, {tool_cache.misses} misses ({hit_rate:.1f}% hit rate)\n"
+        if isinstance(connection, MCPConnectionPool):
+            pool_stats = connection.stats()
+            handshake = pool_stats["handshake"]
+            line = (
+                f"{pool_stats['size']} connection(s), {pool_stats['restarts']} reconnects, "
+                f"{pool_stats['retried_calls']} retried calls, "
+                f"handshake p50 {handshake['p50'] * 1000:.0f} ms / max {handshake['max'] * 1000:.0f} ms"
+            )
+            log(f"🔌 Connections: {line}")
+            extra_stats += f"- **Connections**: {line}\n"
+        profiler = getattr(connection, "profiler", None)
+        profile = None
+        extra_sections = ""
+        if profiler is not None:
+            profile = profiler.summarize(since=profile_start, name=slugify(Path(eval_path).stem))
+            extra_sections = profile_section(profile)
+            log(f"🔬 Server profile: {profile['samples']} samples, collapsed stacks in {profile['directory']}")
+            extra_stats += f"- **Server Profile**: {profile['samples']} samples; see [Server Profile](#server-profile)\n"
+        adaptive = None
+        if getattr(connection, "concurrency", None) is not None:
+            adaptive = connection.concurrency.stats(since=run_start)
+            extra_sections += concurrency_section(adaptive)
+            log(f"🎚️ Adaptive concurrency: {summary_line(adaptive)}")
+            extra_stats += f"- **Adaptive Concurrency**: {summary_line(adaptive)}; see [Adaptive Concurrency](#adaptive-concurrency)\n"
+
+        run_metrics = run_metrics if run_metrics is not None else RunMetrics()
+        run_metrics.wall_time = time.perf_counter() - run_start
+        report = build_report(sink, extra_stats, run_metrics, extra_sections)
+
+    if metrics_path:
+        exported = run_metrics.to_dict()
+        if rate_limiter is not None:
+            exported["rate_limiter"] = rate_limiter.stats()
+        if isinstance(connection, MCPConnectionPool):
+            exported["connections"] = connection.stats()
+        if profile is not None:
+            exported["profile"] = profile
+        if adaptive is not None:
+            exported["adaptive_concurrency"] = adaptive
+        metrics_path.write_text(json.dumps(exported, indent=2))
+        log(f"📈 Metrics saved to {metrics_path}")
+    return report
 
-    qa_pairs = parse_evaluation_file(eval_path)
-    print(f"📋 Loaded {len(qa_pairs)} evaluation tasks")
 
-    results = []
-    for i, qa_pair in enumerate(qa_pairs):
-        print(f"Processing task {i + 1}/{len(qa_pairs)}")
-        result = await evaluate_single_task(client, model, qa_pair, tools, connection, i)
-        results.append(result)
+SHARD_HEADER = """
+# Sharded Evaluation Report
 
-    correct = sum(r["score"] for r in results)
-    accuracy = (correct / len(results)) * 100 if results else 0
-    average_duration_s = sum(r["total_duration"] for r in results) / len(results) if results else 0
-    average_tool_calls = sum(r["num_tool_calls"] for r in results) / len(results) if results else 0
-    total_tool_calls = sum(r["num_tool_calls"] for r in results)
+{shards} worker processes, each with its own server connection and scheduler, split the QA pairs round-robin. **Imbalance** is the slowest shard's wall time over the mean; well above 1 means some shards drew much slower tasks.
 
-    report = REPORT_HEADER.format(
-        correct=correct,
-        total=len(results),
-        accuracy=accuracy,
-        average_duration_s=average_duration_s,
-        average_tool_calls=average_tool_calls,
-        total_tool_calls=total_tool_calls,
+| Shard | Tasks | Wall Time (s) | Tasks per Minute | Task p50 (s) | Task p99 (s) | Tool Calls | Tokens per Second | Model Retries |
+|---|---|---|---|---|---|---|---|---|
+{shard_rows}
+
+- **Imbalance**: {imbalance:.2f}×
+
+---
+"""
+
+SHARD_ROW = (
+    "| {shard} | {tasks} | {wall_time:.1f} | {tasks_per_minute:.1f} | {task[p50]:.2f} | {task[p99]:.2f} | "
+    "{tool_calls} | {tokens_per_second:.1f} | {retries} |"
+)
+
+
+def run_shard(settings: dict[str, Any]) -> dict[str, Any]:
+    """Worker process entry point: run one shard of a sharded evaluation (see run_sharded)."""
+    return asyncio.run(_run_shard(**settings))
+
+
+async def _run_shard(
+    eval_path: Path,
+    shard: tuple[int, int],
+    connection_options: dict[str, Any],
+    client_options: dict[str, Any],
+    rate_limits: dict[str, Any],
+    response_cache_options: dict[str, Any] | None,
+    results_path: Path,
+    tool_trace_path: Path | None,
+    trace_path: Path | None,
+    **kwargs: Any,
+) -> dict[str, Any]:
+    def log(text: str):
+        print("\n".join(f"[shard {shard[0]}] {line}" for line in text.splitlines()), flush=True)
+
+    client = create_client(**client_options, max_retries=0)
+    rate_limiter = RateLimiter(**rate_limits)
+    response_cache = ResponseCache(**response_cache_options) if response_cache_options else None
+    run_metrics = RunMetrics()
+    try:
+        async with client, create_connection(**connection_options) as connection:
+            with ExitStack() as stack:
+                tool_trace = stack.enter_context(ToolTraceWriter(tool_trace_path, append=kwargs.get("resume", False))) if tool_trace_path else None
+                trace = stack.enter_context(TraceWriter(trace_path, append=kwargs.get("resume", False))) if trace_path else None
+                await run_evaluation(
+                    eval_path, connection, client=client, response_cache=response_cache, results_path=results_path,
+                    log=log, run_metrics=run_metrics, tool_trace=tool_trace, trace=trace, rate_limiter=rate_limiter,
+                    shard=shard, **kwargs
+                )
+    finally:
+        if response_cache is not None:
+            response_cache.close()
+    return {
+        "shard": shard[0],
+        "metrics": run_metrics.to_dict(),
+        "rate_limiter": rate_limiter.stats(),
+        "response_cache": {"hits": response_cache.hits, "misses": response_cache.misses} if response_cache else None,
+    }
+
+
+async def run_sharded(
+    eval_path: Path,
+    shards: int,
+    connection_options: dict[str, Any],
+    client_options: dict[str, Any] | None = None,
+    rate_limits: dict[str, Any] | None = None,
+    response_cache_options: dict[str, Any] | None = None,
+    results_path: Path | None = None,
+    metrics_path: Path | None = None,
+    tool_trace_path: Path | None = None,
+    trace_path: Path | None = None,
+    **kwargs: Any,
+) -> str:
+    """Split an evaluation across worker processes and merge their results into one report.
+
+    Shard k runs every shards-th QA pair starting at k, in its own process
+    with its own connection (created from connection_options), model client,
+    rate limiter and scheduler, so JSON handling, scoring and the server's
+    stdio traffic use several cores. The per-minute budgets in rate_limits
+    are split evenly between shards. Remaining keyword arguments are passed
+    to run_evaluation in every shard.
+
+    Each shard streams its results to its own file next to results_path
+    (e.g. results.shard0.jsonl; a temporary directory without one), so
+    resume works as long as the shard count is unchanged. Once all shards
+    finish, their results are merged in task order into results_path
+    itself. Tool-call and turn traces are split the same way. The report opens with each shard's
+    throughput, followed by the usual report over all tasks.
+    """
+    rate_limits = dict(rate_limits or {})
+    for budget in ("requests_per_minute", "tokens_per_minute"):
+        if rate_limits.get(budget):
+            rate_limits[budget] /= shards
+
+    print(f"🧩 Splitting {eval_path} across {shards} worker processes")
+    run_start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    with tempfile.TemporaryDirectory() as scratch, ExitStack() as stack:
+        base = results_path or Path(scratch) / "results.jsonl"
+        shard_paths = [suffixed_path(base, f"shard{index}") for index in range(shards)]
+        # Spawn rather than fork: forking a process with a running event loop is unsafe.
+        executor = stack.enter_context(ProcessPoolExecutor(shards, mp_context=multiprocessing.get_context("spawn")))
+        outcomes = await asyncio.gather(*(
+            loop.run_in_executor(executor, run_shard, {
+                "eval_path": eval_path,
+                "shard": (index, shards),
+                "connection_options": connection_options,
+                "client_options": client_options or {},
+                "rate_limits": rate_limits,
+                "response_cache_options": response_cache_options,
+                "results_path": shard_paths[index],
+                "tool_trace_path": suffixed_path(tool_trace_path, f"shard{index}"),
+                "trace_path": suffixed_path(trace_path, f"shard{index}"),
+                **kwargs,
+            })
+            for index in range(shards)
+        ))
+
+        shard_rows = []
+        for outcome in outcomes:
+            summary = outcome["metrics"]
+            wall_time = summary["wall_time"]
+            shard_rows.append(SHARD_ROW.format(
+                shard=outcome["shard"],
+                tasks=summary["tasks"],
+                wall_time=wall_time,
+                tasks_per_minute=summary["tasks"] / wall_time * 60 if wall_time else 0.0,
+                task=summary["task_duration"],
+                tool_calls=summary["total_tool_calls"],
+                tokens_per_second=summary["tokens"]["tokens_per_second"],
+                retries=outcome["rate_limiter"]["retries"],
+            ))
+        wall_times = [outcome["metrics"]["wall_time"] for outcome in outcomes]
+        mean_wall_time = sum(wall_times) / len(wall_times)
+        imbalance = max(wall_times) / mean_wall_time if mean_wall_time else 1.0
+        print(f"🧩 Shards finished; slowest took {imbalance:.2f}× the mean wall time")
+
+        extra_stats = f"- **Shards**: {shards} worker processes, imbalance {imbalance:.2f}×\n"
+        cache_stats = [outcome["response_cache"] for outcome in outcomes if outcome["response_cache"]]
+        if cache_stats:
+            hits = sum(stats["hits"] for stats in cache_stats)
+            misses = sum(stats["misses"] for stats in cache_stats)
+            extra_stats += f"- **Response Cache ({response_cache_options['mode']})**: {hits} hits, {misses} misses\n"
+
+        run_metrics = RunMetrics()
+        run_metrics.wall_time = time.perf_counter() - run_start
+        sinks = [stack.enter_context(ResultSink(path, resume=True)) for path in shard_paths]
+        results = heapq.merge(*sinks, key=lambda result: result["task_index"])
+        if results_path:
+            # One results file for the whole run, as compare_runs.py expects.
+            with ResultSink(results_path) as merged:
+                for result in results:
+                    merged.write(result)
+            print(f"💾 Merged shard results into {results_path}")
+            results = stack.enter_context(ResultSink(results_path, resume=True))
+        report = SHARD_HEADER.format(shards=shards, shard_rows="\n".join(shard_rows), imbalance=imbalance)
+        report += build_report(results, extra_stats, run_metrics)
+
+    if metrics_path:
+        exported = run_metrics.to_dict()
+        exported["shards"] = outcomes
+        metrics_path.write_text(json.dumps(exported, indent=2))
+        print(f"📈 Metrics saved to {metrics_path}")
+    return report
+
+
+def slugify(name: str) -> str:
+    """Make a server or file name safe to use in a file name."""
+    return re.sub(r"[^\w.-]+", "_", name).strip("_")
+
+
+def suffixed_path(path: Path | None, name: str) -> Path | None:
+    """path with name (made filename-safe) inserted before its suffix, e.g. results.v2.jsonl."""
+    if path is None:
+        return None
+    return path.with_name(f"{path.stem}.{slugify(name)}{path.suffix}")
+
+
+COMPARISON_HEADER = """
+# Server Comparison Report
+
+Each server ran the same {total} QA pairs from `{eval_file}`. Deltas are relative to `{baseline}`.
+
+## Summary
+
+| Server | Accuracy | Δ Accuracy | Task p50 (s) | Task p90 (s) | Task p99 (s) | Δ Task p50 | Tool Call p50 (s) | Tool Call p99 (s) | Tool Calls | Tokens | Tokens per Task | Outcomes |
+|---|---|---|---|---|---|---|---|---|---|---|---|---|
+{summary_rows}
+
+## Tool Latency by Server
+
+p50 / p99 seconds per call.
+
+| Tool | {server_columns} |
+|---|{column_rules}
+{tool_rows}
+"""
+
+COMPARISON_ROW = (
+    "| `{name}` | {correct}/{tasks} ({accuracy:.1f}%) | {accuracy_delta} | {task[p50]:.2f} | {task[p90]:.2f} | "
+    "{task[p99]:.2f} | {p50_delta} | {tool[p50]:.2f} | {tool[p99]:.2f} | {tool_calls} | {tokens} | "
+    "{tokens_per_task:.0f} | {outcomes} |"
+)
+
+
+def build_comparison_report(eval_path: Path, reports: dict[str, str], metrics: dict[str, RunMetrics]) -> str:
+    """Build a Markdown report comparing servers, followed by each server's full report.
+
+    The first server in reports is the baseline that deltas are computed against.
+    """
+    summaries = {name: run_metrics.to_dict() for name, run_metrics in metrics.items()}
+    baseline = next(iter(summaries))
+    base = summaries[baseline]
+
+    summary_rows = []
+    for name, summary in summaries.items():
+        if name == baseline:
+            accuracy_delta = p50_delta = "—"
+        else:
+            accuracy_delta = f"{(summary['accuracy'] - base['accuracy']) * 100:+.1f} pp"
+            base_p50 = base["task_duration"]["p50"]
+            p50_delta = f"{(summary['task_duration']['p50'] / base_p50 - 1) * 100:+.0f}%" if base_p50 else "N/A"
+        summary_rows.append(COMPARISON_ROW.format(
+            name=name,
+            correct=f"{round(summary['correct'], 2):g}",
+            tasks=summary["tasks"],
+            accuracy=summary["accuracy"] * 100,
+            accuracy_delta=accuracy_delta,
+            task=summary["task_duration"],
+            p50_delta=p50_delta,
+            tool=summary["tool_calls"],
+            tool_calls=summary["total_tool_calls"],
+            tokens=summary["tokens"]["total_tokens"],
+            tokens_per_task=summary["tokens"]["tokens_per_task"],
+            outcomes=", ".join(f"{count} {status}" for status, count in sorted(summary["statuses"].items())) or "N/A",
+        ))
+
+    tool_names = sorted({tool for summary in summaries.values() for tool in summary["tools"]})
+    tool_rows = []
+    for tool in tool_names:
+        cells = []
+        for summary in summaries.values():
+            stats = summary["tools"].get(tool)
+            cells.append(f"{stats['p50']:.2f} / {stats['p99']:.2f}" if stats else "—")
+        tool_rows.append(f"| `{tool}` | " + " | ".join(cells) + " |")
+
+    report = COMPARISON_HEADER.format(
+        total=base["tasks"],
+        eval_file=eval_path,
+        baseline=baseline,
+        summary_rows="\n".join(summary_rows),
+        server_columns=" | ".join(f"`{name}`" for name in summaries),
+        column_rules="---|" * len(summaries),
+        tool_rows="\n".join(tool_rows) or "| _no tool calls_ |" + " |" * len(summaries),
     )
+    for name, server_report in reports.items():
+        report += f"\n---\n\n## Server `{name}`\n{server_report}"
+    return report
 
-    report += "".join([
-        TASK_TEMPLATE.format(
-            task_num=i + 1,
-            question=qa_pair["question"],
-            expected_answer=qa_pair["answer"],
-            actual_answer=result["actual"] or "N/A",
-            correct_indicator="✅" if result["score"] else "❌",
-            total_duration=result["total_duration"],
-            tool_calls=json.dumps(result["tool_calls"], indent=2),
-            summary=result["summary"] or "N/A",
-            feedback=result["feedback"] or "N/A",
-        )
-        for i, (qa_pair, result) in enumerate(zip(qa_pairs, results))
-    ])
 
+async def run_comparison(
+    eval_path: Path,
+    connections: dict[str, Any],
+    results_path: Path | None = None,
+    metrics_path: Path | None = None,
+    tool_trace_path: Path | None = None,
+    trace_path: Path | None = None,
+    **kwargs: Any,
+) -> str:
+    """Run the same evaluation against several servers concurrently and compare them.
+
+    connections maps a display name to a connected MCP connection; the first
+    one is the baseline. Remaining keyword arguments are passed to
+    run_evaluation for every server. With results_path, tool_trace_path and
+    trace_path, each server writes to its own file next to them, named after
+    the server. A response cache is scoped per server, so no server is
+    served another's recorded turns. If metrics_path is given, every
+    server's statistics are written there as one JSON object keyed by server
+    name.
+    """
+    reports: dict[str, str] = {}
+    metrics = {name: RunMetrics() for name in connections}
+
+    async def run_server(name: str, connection: Any):
+        def log(text: str):
+            print("\n".join(f"[{name}] {line}" for line in text.splitlines()), flush=True)
+
+        with ExitStack() as stack:
+            tool_trace = trace = None
+            if tool_trace_path is not None:
+                tool_trace = stack.enter_context(ToolTraceWriter(suffixed_path(tool_trace_path, name), append=kwargs.get("resume", False)))
+            if trace_path is not None:
+                trace = stack.enter_context(TraceWriter(suffixed_path(trace_path, name), append=kwargs.get("resume", False)))
+            options = dict(kwargs)
+            if options.get("response_cache") is not None:
+                options["response_cache"] = ScopedResponseCache(options["response_cache"], name)
+            reports[name] = await run_evaluation(
+                eval_path, connection, results_path=suffixed_path(results_path, name), log=log,
+                run_metrics=metrics[name], tool_trace=tool_trace, trace=trace, **options
+            )
+
+    print(f"⚖️ Comparing {len(connections)} servers")
+    await run_bounded(connections.items(), lambda item: run_server(*item), len(connections))
+
+    if metrics_path:
+        metrics_path.write_text(json.dumps({name: run_metrics.to_dict() for name, run_metrics in metrics.items()}, indent=2))
+        print(f"📈 Metrics saved to {metrics_path}")
+    return build_comparison_report(eval_path, {name: reports[name] for name in connections}, metrics)
+
+
+BATCH_HEADER = """
+# Batch Evaluation Report
+
+{files} evaluation files over one server connection, {total} QA pairs in total.
+
+## Summary
+
+| Evaluation File | Accuracy | Task p50 (s) | Task p90 (s) | Task p99 (s) | Tool Calls | Tokens | Wall Time (s) | Outcomes |
+|---|---|---|---|---|---|---|---|---|
+{summary_rows}
+"""
+
+BATCH_ROW = (
+    "| {name} | {correct}/{tasks} ({accuracy:.1f}%) | {task[p50]:.2f} | {task[p90]:.2f} | {task[p99]:.2f} | "
+    "{tool_calls} | {tokens} | {wall_time:.1f} | {outcomes} |"
+)
+
+
+def build_batch_report(combined_report: str, reports: dict[str, str], metrics: dict[str, RunMetrics], combined: RunMetrics) -> str:
+    """Build a Markdown report with one summary row per evaluation file and a combined row.
+
+    The combined report covers every file's tasks; each file's own report follows it.
+    """
+    summary_rows = []
+    summaries = {name: run_metrics.to_dict() for name, run_metrics in metrics.items()}
+    for name, summary in [*((f"`{name}`", summary) for name, summary in summaries.items()), ("**All files**", combined.to_dict())]:
+        summary_rows.append(BATCH_ROW.format(
+            name=name,
+            correct=f"{round(summary['correct'], 2):g}",
+            tasks=summary["tasks"],
+            accuracy=summary["accuracy"] * 100,
+            task=summary["task_duration"],
+            tool_calls=summary["total_tool_calls"],
+            tokens=summary["tokens"]["total_tokens"],
+            wall_time=summary["wall_time"],
+            outcomes=", ".join(f"{count} {status}" for status, count in sorted(summary["statuses"].items())) or "N/A",
+        ))
+
+    report = BATCH_HEADER.format(files=len(reports), total=combined.tasks, summary_rows="\n".join(summary_rows))
+    report += f"\n---\n\n## All Files\n{combined_report}"
+    for name, file_report in reports.items():
+        report += f"\n---\n\n## File `{name}`\n{file_report}"
     return report
 
 
+async def run_batch(
+    eval_paths: list[Path],
+    connection: Any,
+    results_path: Path | None = None,
+    metrics_path: Path | None = None,
+    tool_trace_path: Path | None = None,
+    trace_path: Path | None = None,
+    deadline: float | None = None,
+    log: Callable[[str], None] = print,
+    **kwargs: Any,
+) -> str:
+    """Run several evaluation files, one after another, over one connected MCP connection.
+
+    The server is started and initialized once and its tools are listed
+    once, however many files there are. Remaining keyword arguments are
+    passed to run_evaluation for every file. With results_path,
+    tool_trace_path and trace_path, each file writes to its own file next to
+    them, named after the evaluation file, so --resume works per file. The
+    deadline covers the whole batch. If metrics_path is given, each file's
+    statistics and the combined ones are written there as one JSON object.
+    """
+    batch_start = time.perf_counter()
+    reports: dict[str, str] = {}
+    metrics: dict[str, RunMetrics] = {}
+    log(f"📚 Evaluating {len(eval_paths)} files over one connection")
+
+    for eval_path in eval_paths:
+        name = eval_path.stem
+        remaining = None
+        if deadline is not None:
+            remaining = max(0.0, deadline - (time.perf_counter() - batch_start))
+        metrics[name] = RunMetrics()
+        with ExitStack() as stack:
+            tool_trace = trace = None
+            if tool_trace_path is not None:
+                tool_trace = stack.enter_context(ToolTraceWriter(suffixed_path(tool_trace_path, name), append=kwargs.get("resume", False)))
+            if trace_path is not None:
+                trace = stack.enter_context(TraceWriter(suffixed_path(trace_path, name), append=kwargs.get("resume", False)))
+            reports[name] = await run_evaluation(
+                eval_path, connection, results_path=suffixed_path(results_path, name), deadline=remaining,
+                log=log, run_metrics=metrics[name], tool_trace=tool_trace, trace=trace, **kwargs
+            )
+
+    combined = RunMetrics()
+    for run_metrics in metrics.values():
+        combined.merge(run_metrics)
+    combined.wall_time = time.perf_counter() - batch_start
+    log(f"📚 Completed {combined.tasks} tasks from {len(eval_paths)} files in {combined.wall_time:.1f}s")
+
+    if metrics_path:
+        exported = {
+            "files": {name: run_metrics.to_dict() for name, run_metrics in metrics.items()},
+            "combined": combined.to_dict(),
+        }
+        if kwargs.get("rate_limiter") is not None:
+            exported["rate_limiter"] = kwargs["rate_limiter"].stats()
+        metrics_path.write_text(json.dumps(exported, indent=2))
+        log(f"📈 Metrics saved to {metrics_path}")
+    return build_batch_report(build_report([], run_metrics=combined), reports, metrics, combined)
+
+
+def expand_eval_paths(paths: list[Path]) -> list[Path]:
+    """Evaluation files from files and directories (every *.xml in them, sorted by name)."""
+    expanded = []
+    for path in paths:
+        if path.is_dir():
+            expanded += sorted(path.glob("*.xml"))
+        else:
+            expanded.append(path)
+    return expanded
+
+
 def parse_headers(header_list: list[str]) -> dict[str, str]:
     """Parse header strings in format 'Key: Value' into a dictionary."""
     headers = {}
@@ -302,6 +1395,29 @@ def parse_env_vars(env_list: list[str]) -> dict[str, str]:
     return env
 
 
+def parse_server_spec(spec: str, transport: str) -> tuple[str, dict[str, Any]]:
+    """Parse a '[NAME=]COMMAND ARGS...' or '[NAME=]URL' server spec into a name and create_connection arguments.
+
+    URLs use the given transport if it is sse or http, and http otherwise.
+    Without a name, the spec itself is used.
+    """
+    match = re.match(r"([\w.-]+)=(.+)", spec)
+    name, target = match.groups() if match else (spec, spec)
+    if re.match(r"https?://", target):
+        return name, {"transport": transport if transport in ("sse", "http") else "http", "url": target}
+    command, *command_args = shlex.split(target)
+    return name, {"transport": "stdio", "command": command, "args": command_args}
+
+
+def write_report(report: str, output: Path | None):
+    """Save the report to output, or print it if not given."""
+    if output:
+        output.write_text(report)
+        print(f"\n✅ Report saved to {output}")
+    else:
+        print("\n" + report)
+
+
 async def main():
     parser = argparse.ArgumentParser(
         description="Evaluate MCP servers using test questions",
@@ -316,10 +1432,16 @@ Examples:
 
   # Evaluate an HTTP MCP server with custom model
   python evaluation.py -t http -u https://example.com/mcp -m claude-3-5-sonnet-20241022 eval.xml
+
+  # Compare two builds of a server side by side
+  python evaluation.py --server "v1=python server_v1.py" --server "v2=python server_v2.py" eval.xml
+
+  # Evaluate every file in a directory over one server connection
+  python evaluation.py -c python -a my_server.py evals/
         """,
     )
 
-    parser.add_argument("eval_file", type=Path, help="Path to evaluation XML file")
+    parser.add_argument("eval_files", type=Path, nargs="+", metavar="eval_file", help="Evaluation XML files, or directories of them, to run over one server connection")
     parser.add_argument("-t", "--transport", choices=["stdio", "sse", "http"], default="stdio", help="Transport type (default: stdio)")
     parser.add_argument("-m", "--model", default="claude-3-7-sonnet-20250219", help="Claude model to use (default: claude-3-7-sonnet-20250219)")
 
@@ -332,41 +1454,269 @@ Examples:
     remote_group.add_argument("-u", "--url", help="MCP server URL (sse/http only)")
     remote_group.add_argument("-H", "--header", nargs="+", dest="headers", help="HTTP headers in 'Key: Value' format (sse/http only)")
 
+    compare_group = parser.add_argument_group("comparison options")
+    compare_group.add_argument(
+        "--server",
+        action="append",
+        dest="servers",
+        metavar="[NAME=]SPEC",
+        help="Additional server to evaluate side by side: a quoted stdio command line or an sse/http URL (repeatable)",
+    )
+
     parser.add_argument("-o", "--output", type=Path, help="Output file for evaluation report (default: stdout)")
+    parser.add_argument("--results", type=Path, help="Stream task results to this JSONL file as they finish")
+    parser.add_argument("--resume", action="store_true", help="Skip QA pairs that already have a result in --results")
+    parser.add_argument("--metrics-json", type=Path, help="Write run latency statistics to this JSON file")
+    parser.add_argument("--tool-trace", type=Path, help="Record every tool call to this JSONL file, for replay with loadtest.py")
+    parser.add_argument("--trace", type=Path, help="Record every turn (request hash, response, tool calls, timings) to this compressed trace file")
+    parser.add_argument("--schema-cache", type=Path, help="Reuse tool definitions from this file on warm starts (validated against the server version and script)")
+    parser.add_argument("--refresh-schema", action="store_true", help="Ask the server for its tools even if --schema-cache has them, and store the fresh definitions")
+    parser.add_argument("--cache-tools", nargs="+", metavar="TOOL", help="Idempotent tools whose results may be cached for the run")
+    parser.add_argument("--tool-cache-size", type=int, default=1024, help="Maximum cached tool results (default: 1024)")
+    parser.add_argument("--tool-cache-ttl", type=float, help="Seconds before a cached tool result expires (default: never)")
+    parser.add_argument("--profile", type=Path, metavar="DIR", help="Sample Python stdio servers' stacks into DIR and report hot functions per tool")
+    parser.add_argument("--profile-interval", type=float, default=0.005, help="Seconds between --profile samples (default: 0.005)")
+    parser.add_argument("--trials", type=int, default=1, help="Attempts per question, run in parallel and aggregated into pass@k (default: 1)")
+    parser.add_argument("--no-early-stop", dest="early_stop", action="store_false", help="Always run all --trials, even once a question's outcome is settled")
+    parser.add_argument("-j", "--concurrency", type=int, default=1, help="Number of tasks to run concurrently (default: 1)")
+    parser.add_argument("--pool-size", type=int, default=1, help="Server processes (stdio) or sessions (sse/http) to spread tool calls over (default: 1)")
+    parser.add_argument("--reconnect-timeout", type=float, default=60.0, help="Seconds a tool call waits for a crashed server to reconnect before failing (default: 60)")
+    parser.add_argument("--shards", type=int, default=1, help="Worker processes to split the QA pairs over, each with its own connection and -j tasks (default: 1)")
+
+    adaptive_group = parser.add_argument_group("adaptive concurrency options")
+    adaptive_group.add_argument("--adaptive-p95", type=float, metavar="SECONDS", help="Adapt the limit on in-flight tool calls (AIMD) to keep their p95 latency under this")
+    adaptive_group.add_argument("--adaptive-error-rate", type=float, default=0.01, help="Tool error rate the adaptive limit keeps under (default: 0.01)")
+    adaptive_group.add_argument("--adaptive-max", type=int, default=64, help="Upper bound on the adaptive limit (default: 64)")
+
+    client_group = parser.add_argument_group("model client options")
+    client_group.add_argument("--base-url", help="Anthropic API base URL, e.g. a local stand-in server for offline benchmarks")
+    client_group.add_argument("--max-connections", type=int, default=100, help="Maximum pooled HTTP connections to the API (default: 100)")
+    client_group.add_argument("--stream", action="store_true", help="Stream model responses, measuring time to first token and starting each tool call as soon as its tool_use block is complete")
+    client_group.add_argument("--keepalive-expiry", type=float, default=30.0, help="Seconds to keep idle API connections alive (default: 30)")
+
+    rate_group = parser.add_argument_group("rate limit options")
+    rate_group.add_argument("--rpm", type=float, help="Model requests per minute shared by all tasks (default: unlimited)")
+    rate_group.add_argument("--tpm", type=float, help="Model tokens per minute (uncached input, cache writes and output) shared by all tasks (default: unlimited)")
+    rate_group.add_argument("--max-retries", type=int, default=8, help="Retries of a rate-limited or failed model request, with backoff (default: 8)")
+
+    budget_group = parser.add_argument_group("time and turn budgets")
+    budget_group.add_argument("--max-turns", type=int, help="Maximum model turns per task (default: no limit)")
+    budget_group.add_argument("--tool-timeout", type=float, help="Seconds before a single tool call is cancelled (default: no limit)")
+    budget_group.add_argument("--task-timeout", type=float, help="Seconds before a task is cancelled (default: no limit)")
+    budget_group.add_argument("--deadline", type=float, help="Seconds before the whole run stops starting and cancels tasks (default: no limit)")
+
+    compaction_group = parser.add_argument_group("context compaction options")
+    compaction_group.add_argument("--context-budget", type=int, help="Compact old tool results to keep each prompt under about this many tokens")
+    compaction_group.add_argument("--compact-keep-recent", type=int, default=2, help="Most recent tool-result turns never compacted (default: 2)")
+    compaction_group.add_argument("--compact-keep-chars", type=int, default=500, help="Characters kept from the start of a truncated result (default: 500)")
+
+    cache_group = parser.add_argument_group("response cache options")
+    cache_mode = cache_group.add_mutually_exclusive_group()
+    cache_mode.add_argument("--record", dest="cache_mode", action="store_const", const="record", help="Call the model and record every response")
+    cache_mode.add_argument("--replay", dest="cache_mode", action="store_const", const="replay", help="Serve responses from the cache only; fail on a miss")
+    cache_mode.add_argument("--read-through", dest="cache_mode", action="store_const", const="read-through", help="Serve cached responses, calling the model and recording on a miss")
+    cache_group.add_argument("--response-cache", type=Path, default=Path(".eval_cache/responses.bin"), help="Response cache file (default: .eval_cache/responses.bin)")
+    cache_group.add_argument("--response-cache-max-mb", type=int, default=512, help="Compact the response cache beyond this size in MB (default: 512)")
 
     args = parser.parse_args()
 
-    if not args.eval_file.exists():
-        print(f"Error: Evaluation file not found: {args.eval_file}")
+    if args.concurrency < 1:
+        print("Error: --concurrency must be at least 1")
+        sys.exit(1)
+
+    if (args.adaptive_p95 is not None and args.adaptive_p95 <= 0) or args.adaptive_max < 1:
+        print("Error: --adaptive-p95 and --adaptive-max must be positive")
+        sys.exit(1)
+
+    if args.trials < 1:
+        print("Error: --trials must be at least 1")
+        sys.exit(1)
+
+    if args.shards < 1:
+        print("Error: --shards must be at least 1")
+        sys.exit(1)
+
+    if args.resume and not args.results:
+        print("Error: --resume requires --results")
+        sys.exit(1)
+
+    if args.refresh_schema and not args.schema_cache:
+        print("Error: --refresh-schema requires --schema-cache")
+        sys.exit(1)
+
+    missing = [path for path in args.eval_files if not path.exists()]
+    if missing:
+        print(f"Error: Evaluation file not found: {missing[0]}")
+        sys.exit(1)
+    eval_paths = expand_eval_paths(args.eval_files)
+    if not eval_paths:
+        print("Error: No evaluation files (*.xml) found")
+        sys.exit(1)
+    if len({path.stem for path in eval_paths}) < len(eval_paths):
+        print("Error: Evaluation file names must be unique, as per-file outputs are named after them")
         sys.exit(1)
 
     headers = parse_headers(args.headers) if args.headers else None
     env_vars = parse_env_vars(args.env) if args.env else None
+    schema_cache = ToolSchemaCache(args.schema_cache, args.refresh_schema) if args.schema_cache else None
+
+    servers = []
+    if args.command or args.url or not args.servers:
+        name = args.url if args.transport != "stdio" else shlex.join([args.command or "", *(args.args or [])])
+        servers.append((name, {"transport": args.transport, "command": args.command, "args": args.args, "url": args.url}))
+    for spec in args.servers or []:
+        servers.append(parse_server_spec(spec, args.transport))
+    if len({name for name, _ in servers}) < len(servers):
+        print("Error: Server names must be unique; use NAME=SPEC to tell them apart")
+        sys.exit(1)
+    if len(servers) > 1 and len(eval_paths) > 1:
+        print("Error: Comparing servers takes a single evaluation file")
+        sys.exit(1)
+    if args.shards > 1 and (len(servers) > 1 or len(eval_paths) > 1):
+        print("Error: --shards takes a single server and evaluation file")
+        sys.exit(1)
+    if args.shards > 1 and args.profile:
+        print("Error: --profile cannot be combined with --shards")
+        sys.exit(1)
+    if args.shards > 1 and args.adaptive_p95:
+        print("Error: --adaptive-p95 cannot be combined with --shards")
+        sys.exit(1)
+    if args.shards > 1 and args.cache_mode in ("record", "read-through"):
+        print("Error: --shards can only --replay the response cache, as shards cannot share a cache file for writing")
+        sys.exit(1)
 
+    connection_options = {}
+    connections = {}
     try:
-        connection = create_connection(
-            transport=args.transport,
-            command=args.command,
-            args=args.args,
-            env=env_vars,
-            url=args.url,
-            headers=headers,
-        )
+        for name, spec in servers:
+            connection_options[name] = {
+                **spec,
+                "env": env_vars,
+                "headers": headers,
+                "tool_cache": ToolResultCache(args.cache_tools, args.tool_cache_size, args.tool_cache_ttl) if args.cache_tools else None,
+                "pool_size": args.pool_size,
+                "schema_cache": schema_cache,
+                "call_timeout": args.tool_timeout,
+                "reconnect_timeout": args.reconnect_timeout,
+            }
+            if args.profile:
+                profile_dir = args.profile / slugify(name) if len(servers) > 1 else args.profile
+                connection_options[name]["profiler"] = ServerProfiler(profile_dir, args.profile_interval)
+            if args.adaptive_p95:
+                connection_options[name]["concurrency"] = AdaptiveConcurrency(
+                    args.adaptive_p95, args.adaptive_error_rate, max_limit=args.adaptive_max
+                )
+            connections[name] = create_connection(**connection_options[name])
     except ValueError as e:
         print(f"Error: {e}")
         sys.exit(1)
 
-    print(f"🔗 Connecting to MCP server via {args.transport}...")
+    compaction = None
+    if args.context_budget:
+        compaction = {
+            "budget_tokens": args.context_budget,
+            "keep_recent": args.compact_keep_recent,
+            "keep_chars": args.compact_keep_chars,
+        }
 
-    async with connection:
-        print("✅ Connected successfully")
-        report = await run_evaluation(args.eval_file, connection, args.model)
+    if args.shards > 1:
+        try:
+            report = await run_sharded(
+                eval_paths[0],
+                args.shards,
+                connection_options[servers[0][0]],
+                client_options={
+                    "base_url": args.base_url,
+                    "max_connections": args.max_connections,
+                    "keepalive_expiry": args.keepalive_expiry,
+                },
+                rate_limits={"requests_per_minute": args.rpm, "tokens_per_minute": args.tpm, "max_retries": args.max_retries},
+                response_cache_options={
+                    "path": args.response_cache,
+                    "mode": args.cache_mode,
+                    "max_bytes": args.response_cache_max_mb * 1024 * 1024,
+                } if args.cache_mode else None,
+                results_path=args.results,
+                metrics_path=args.metrics_json,
+                tool_trace_path=args.tool_trace,
+                trace_path=args.trace,
+                model=args.model,
+                concurrency=args.concurrency,
+                resume=args.resume,
+                compaction=compaction,
+                max_turns=args.max_turns,
+                task_timeout=args.task_timeout,
+                deadline=args.deadline,
+                trials=args.trials,
+                early_stop=args.early_stop,
+                stream=args.stream,
+            )
+        except ET.ParseError:
+            sys.exit(1)
+        write_report(report, args.output)
+        return
+
+    pool_note = f" with a pool of {args.pool_size}" if args.pool_size > 1 else ""
+    if len(connections) == 1:
+        print(f"🔗 Connecting to MCP server via {args.transport}{pool_note}...")
+    else:
+        print(f"🔗 Connecting to {len(connections)} MCP servers{pool_note}...")
+
+    client = create_client(
+        base_url=args.base_url,
+        max_connections=args.max_connections,
+        keepalive_expiry=args.keepalive_expiry,
+        max_retries=0,
+    )
+    rate_limiter = RateLimiter(args.rpm, args.tpm, args.max_retries)
+
+    response_cache = None
+    if args.cache_mode:
+        response_cache = ResponseCache(args.response_cache, args.cache_mode, args.response_cache_max_mb * 1024 * 1024)
+
+    options = {
+        "model": args.model,
+        "concurrency": args.concurrency,
+        "client": client,
+        "response_cache": response_cache,
+        "results_path": args.results,
+        "resume": args.resume,
+        "metrics_path": args.metrics_json,
+        "compaction": compaction,
+        "max_turns": args.max_turns,
+        "task_timeout": args.task_timeout,
+        "deadline": args.deadline,
+        "rate_limiter": rate_limiter,
+        "trials": args.trials,
+        "early_stop": args.early_stop,
+        "stream": args.stream,
+    }
 
-        if args.output:
-            args.output.write_text(report)
-            print(f"\n✅ Report saved to {args.output}")
-        else:
-            print("\n" + report)
+    try:
+        async with client, AsyncExitStack() as stack:
+            for connection in connections.values():
+                await stack.enter_async_context(connection)
+            print("✅ Connected successfully")
+            if len(connections) > 1:
+                report = await run_comparison(
+                    eval_paths[0], connections, tool_trace_path=args.tool_trace, trace_path=args.trace, **options
+                )
+            elif len(eval_paths) > 1:
+                report = await run_batch(
+                    eval_paths, connection, tool_trace_path=args.tool_trace, trace_path=args.trace, **options
+                )
+            else:
+                tool_trace = stack.enter_context(ToolTraceWriter(args.tool_trace, append=args.resume)) if args.tool_trace else None
+                trace = stack.enter_context(TraceWriter(args.trace, append=args.resume)) if args.trace else None
+                report = await run_evaluation(eval_paths[0], connection, tool_trace=tool_trace, trace=trace, **options)
+    except ET.ParseError:
+        # Already reported; a partial report would pass for a complete one.
+        sys.exit(1)
+    finally:
+        if response_cache is not None:
+            response_cache.close()
+
+    write_report(report, args.output)
 
 
 if __name__ == "__main__":
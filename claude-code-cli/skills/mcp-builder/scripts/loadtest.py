@@ -0,0 +1,417 @@
+"""MCP Server Load Test
+
+This script replays recorded tool calls against an MCP server without any
+model calls, to measure its throughput, error rate and latency under load.
+Record the calls with `evaluation.py --tool-trace` or `--trace`.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import sys
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+from concurrency import AdaptiveConcurrency, concurrency_section, summary_line
+from connections import MCPConnectionPool, create_connection
+from evaluation import parse_env_vars, parse_headers
+from metrics import latency_summary
+from tool_trace import iter_tool_calls
+
+
+class LoadStats:
+    """Per-tool call counts, errors and latencies collected during a load test."""
+
+    def __init__(self):
+        self.calls: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.error_samples: dict[str, str] = {}
+        self.dropped = 0
+
+    def record(self, tool_name: str, latency: float, error: BaseException | None = None):
+        self.calls.setdefault(tool_name, []).append(latency)
+        self.errors.setdefault(tool_name, 0)
+        if error is not None:
+            self.errors[tool_name] += 1
+            self.error_samples.setdefault(tool_name, f"{type(error).__name__}: {error}")
+
+    def summary(self, elapsed: float) -> dict[str, Any]:
+        """Throughput, error rate and latency percentiles per tool and overall."""
+
+        def stats(latencies: list[float], errors: int) -> dict[str, Any]:
+            return {
+                "calls": len(latencies),
+                "errors": errors,
+                "error_rate": errors / len(latencies) if latencies else 0.0,
+                "throughput": len(latencies) / elapsed if elapsed else 0.0,
+                "latency": latency_summary(latencies),
+            }
+
+        return {
+            "elapsed": elapsed,
+            "dropped": self.dropped,
+            "overall": stats([latency for latencies in self.calls.values() for latency in latencies], sum(self.errors.values())),
+            "tools": {name: stats(self.calls[name], self.errors[name]) for name in sorted(self.calls)},
+            "error_samples": self.error_samples,
+        }
+
+
+async def timed_call(
+    connection: Any, tool_name: str, arguments: dict[str, Any], stats: LoadStats, started_at: float
+) -> tuple[float, BaseException | None]:
+    """Call one tool and record its latency, measured from started_at.
+
+    Exceptions, including error results when the connection raises ToolError,
+    count as errors. Returns the latency and the error, if any.
+    """
+    error = None
+    try:
+        await connection.call_tool(tool_name, arguments)
+    except Exception as e:
+        error = e
+    latency = time.perf_counter() - started_at
+    stats.record(tool_name, latency, error)
+    return latency, error
+
+
+async def run_closed_loop(
+    connection: Any,
+    calls: Iterator[tuple[str, dict[str, Any]]],
+    stats: LoadStats,
+    concurrency: int,
+    duration: float,
+    ramp_up: float = 0.0,
+):
+    """Keep concurrency calls in flight, each worker issuing its next call as soon as the last one finishes.
+
+    Workers start evenly spread over ramp_up seconds, and stop issuing calls
+    after duration seconds.
+    """
+    start = time.perf_counter()
+    stop_at = start + duration
+
+    async def worker(index: int):
+        await asyncio.sleep(ramp_up * index / concurrency)
+        while time.perf_counter() < stop_at:
+            tool_name, arguments = next(calls)
+            await timed_call(connection, tool_name, arguments, stats, time.perf_counter())
+
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+
+
+async def run_adaptive_loop(
+    connection: Any,
+    calls: Iterator[tuple[str, dict[str, Any]]],
+    stats: LoadStats,
+    controller: AdaptiveConcurrency,
+    duration: float,
+):
+    """Keep as many calls in flight as the controller allows, issuing the next as soon as a slot frees.
+
+    The controller sees every call's latency and outcome and moves its limit
+    accordingly. Calls stop being issued after duration seconds.
+    """
+    stop_at = time.perf_counter() + duration
+    in_flight: set[asyncio.Task] = set()
+
+    async def adaptive_call(ticket: int, tool_name: str, arguments: dict[str, Any]):
+        latency, error = await timed_call(connection, tool_name, arguments, stats, time.perf_counter())
+        controller.release(ticket, latency, error is not None)
+
+    while time.perf_counter() < stop_at:
+        ticket = await controller.acquire()
+        if time.perf_counter() >= stop_at:
+            controller.release(ticket)
+            break
+        tool_name, arguments = next(calls)
+        task = asyncio.create_task(adaptive_call(ticket, tool_name, arguments))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    await asyncio.gather(*in_flight)
+
+
+def arrival_time(index: int, qps: float, ramp_up: float) -> float:
+    """Seconds after the start at which call index is due, with the rate ramping linearly to qps."""
+    if index < qps * ramp_up / 2:
+        return math.sqrt(2 * ramp_up * index / qps)
+    return index / qps + ramp_up / 2
+
+
+async def run_open_loop(
+    connection: Any,
+    calls: Iterator[tuple[str, dict[str, Any]]],
+    stats: LoadStats,
+    qps: float,
+    duration: float,
+    ramp_up: float = 0.0,
+    max_in_flight: int = 1000,
+):
+    """Issue calls at a fixed rate of qps, whether or not earlier calls have finished.
+
+    Latency is measured from when each call was due rather than when it was
+    sent, so a slow server or a saturated client is not hidden by late sends.
+    Calls due while max_in_flight calls are outstanding are dropped.
+    """
+    start = time.perf_counter()
+    in_flight: set[asyncio.Task] = set()
+    for index in itertools.count():
+        due = start + arrival_time(index, qps, ramp_up)
+        if due - start >= duration:
+            break
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_in_flight:
+            stats.dropped += 1
+            continue
+        tool_name, arguments = next(calls)
+        task = asyncio.create_task(timed_call(connection, tool_name, arguments, stats, due))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    await asyncio.gather(*in_flight)
+
+
+REPORT_HEADER = """
+# Load Test Report
+
+## Summary
+
+- **Load**: {load}
+- **Trace**: {trace_calls} recorded calls from {trace_files}
+- **Duration**: {elapsed:.1f}s
+- **Calls**: {overall[calls]} ({overall[throughput]:.1f}/s)
+- **Errors**: {overall[errors]} ({error_rate:.2f}%)
+{extra_stats}
+## Per-Tool Results
+
+Latency in seconds.
+
+| Tool | Calls | Calls/s | Errors | Error Rate | Mean | p50 | p90 | p99 | Max |
+|------|-------|---------|--------|------------|------|-----|-----|-----|-----|
+{tool_rows}
+"""
+
+TOOL_ROW = (
+    "| {name} | {calls} | {throughput:.1f} | {errors} | {error_rate_pct:.2f}% | {latency[mean]:.3f} | "
+    "{latency[p50]:.3f} | {latency[p90]:.3f} | {latency[p99]:.3f} | {latency[max]:.3f} |"
+)
+
+
+def build_report(summary: dict[str, Any], load: str, trace_files: list[Path], trace_calls: int, extra_stats: str = "") -> str:
+    """Build the Markdown load test report from LoadStats.summary()."""
+    tool_rows = [
+        TOOL_ROW.format(name=f"`{name}`", error_rate_pct=stats["error_rate"] * 100, **stats)
+        for name, stats in summary["tools"].items()
+    ]
+    tool_rows.append(TOOL_ROW.format(name="**all**", error_rate_pct=summary["overall"]["error_rate"] * 100, **summary["overall"]))
+    if summary["dropped"]:
+        extra_stats += f"- **Dropped**: {summary['dropped']} calls not sent because too many were already in flight\n"
+    for name, sample in summary["error_samples"].items():
+        extra_stats += f"- **First `{name}` error**: {sample}\n"
+    return REPORT_HEADER.format(
+        load=load,
+        trace_calls=trace_calls,
+        trace_files=", ".join(f"`{path}`" for path in trace_files),
+        elapsed=summary["elapsed"],
+        overall=summary["overall"],
+        error_rate=summary["overall"]["error_rate"] * 100,
+        extra_stats=extra_stats,
+        tool_rows="\n".join(tool_rows),
+    )
+
+
+async def run_load_test(
+    trace_files: list[Path],
+    connection: Any,
+    qps: float | None = None,
+    concurrency: int = 1,
+    duration: float = 60.0,
+    ramp_up: float = 0.0,
+    max_in_flight: int = 1000,
+    metrics_path: Path | None = None,
+    controller: AdaptiveConcurrency | None = None,
+) -> str:
+    """Replay recorded tool calls against a connected server and report the results.
+
+    With qps, calls are issued open-loop at that rate; with a controller,
+    as many as it allows are kept in flight, and the report traces how its
+    limit moved; otherwise concurrency calls are kept in flight (closed
+    loop). Recorded calls are replayed in order and repeated until duration
+    seconds have passed. ramp_up applies to the open and closed loops; the
+    adaptive limit ramps up on its own.
+    """
+    recorded = list(iter_tool_calls(trace_files))
+    if not recorded:
+        raise ValueError("No tool calls found in the trace files")
+    tools = {tool["name"] for tool in await connection.list_tools()}
+    unknown = sorted({name for name, _ in recorded} - tools)
+    if unknown:
+        print(f"⚠️ Trace calls tools the server does not list: {', '.join(unknown)}")
+
+    if qps:
+        load = f"{qps:g} calls/s open loop"
+    elif controller is not None:
+        load = f"adaptive concurrency up to {controller.max_limit}, p95 target {controller.latency_target:g}s"
+    else:
+        load = f"{concurrency} concurrent calls, closed loop"
+    if ramp_up:
+        load += f", {ramp_up:g}s ramp-up"
+    print(f"🚀 Replaying {len(recorded)} recorded calls for {duration:g}s at {load}")
+
+    stats = LoadStats()
+    calls = itertools.cycle(recorded)
+    start = time.perf_counter()
+    if qps:
+        await run_open_loop(connection, calls, stats, qps, duration, ramp_up, max_in_flight)
+    elif controller is not None:
+        await run_adaptive_loop(connection, calls, stats, controller, duration)
+    else:
+        await run_closed_loop(connection, calls, stats, concurrency, duration, ramp_up)
+    summary = stats.summary(time.perf_counter() - start)
+    print(f"📋 Completed {summary['overall']['calls']} calls, {summary['overall']['errors']} errors")
+
+    extra_stats = ""
+    if isinstance(connection, MCPConnectionPool):
+        pool_stats = connection.stats()
+        handshake = pool_stats["handshake"]
+        extra_stats += (
+            f"- **Connections**: {pool_stats['size']} connection(s), {pool_stats['restarts']} reconnects, "
+            f"handshake p50 {handshake['p50'] * 1000:.0f} ms / max {handshake['max'] * 1000:.0f} ms\n"
+        )
+
+    extra_sections = ""
+    if controller is not None:
+        summary["adaptive_concurrency"] = controller.stats(since=start)
+        print(f"🎚️ Adaptive concurrency: {summary_line(summary['adaptive_concurrency'])}")
+        extra_stats += f"- **Adaptive Concurrency**: {summary_line(summary['adaptive_concurrency'])}\n"
+        extra_sections = concurrency_section(summary["adaptive_concurrency"])
+
+    if metrics_path:
+        metrics_path.write_text(json.dumps(summary, indent=2))
+        print(f"📈 Metrics saved to {metrics_path}")
+    return build_report(summary, load, trace_files, len(recorded), extra_stats) + extra_sections
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Load test MCP servers by replaying recorded tool calls",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Record the tool calls an evaluation makes
+  python evaluation.py -c python -a my_server.py --tool-trace calls.jsonl eval.xml
+
+  # Keep 16 calls in flight for two minutes
+  python loadtest.py -c python -a my_server.py -j 16 --duration 120 calls.jsonl
+
+  # Ramp up to 200 calls per second over 30 seconds against an HTTP server
+  python loadtest.py -t http -u https://example.com/mcp --qps 200 --ramp-up 30 calls.jsonl
+
+  # Find how many calls in flight the server takes before p95 latency passes 500 ms
+  python loadtest.py -c python -a my_server.py --adaptive-p95 0.5 --duration 300 calls.jsonl
+        """,
+    )
+
+    parser.add_argument("trace_files", type=Path, nargs="+", help="Tool-call or turn traces recorded with evaluation.py --tool-trace or --trace")
+    parser.add_argument("-t", "--transport", choices=["stdio", "sse", "http"], default="stdio", help="Transport type (default: stdio)")
+
+    stdio_group = parser.add_argument_group("stdio options")
+    stdio_group.add_argument("-c", "--command", help="Command to run MCP server (stdio only)")
+    stdio_group.add_argument("-a", "--args", nargs="+", help="Arguments for the command (stdio only)")
+    stdio_group.add_argument("-e", "--env", nargs="+", help="Environment variables in KEY=VALUE format (stdio only)")
+
+    remote_group = parser.add_argument_group("sse/http options")
+    remote_group.add_argument("-u", "--url", help="MCP server URL (sse/http only)")
+    remote_group.add_argument("-H", "--header", nargs="+", dest="headers", help="HTTP headers in 'Key: Value' format (sse/http only)")
+
+    load_group = parser.add_argument_group("load options")
+    load_mode = load_group.add_mutually_exclusive_group()
+    load_mode.add_argument("--qps", type=float, help="Issue calls open-loop at this many per second")
+    load_mode.add_argument("-j", "--concurrency", type=int, default=1, help="Calls kept in flight, closed loop (default: 1)")
+    load_mode.add_argument("--adaptive-p95", type=float, metavar="SECONDS", help="Adapt the calls kept in flight (AIMD) to keep p95 latency under this, to find the server's knee")
+    load_group.add_argument("--adaptive-error-rate", type=float, default=0.01, help="Adaptive: error rate to keep under (default: 0.01)")
+    load_group.add_argument("--adaptive-max", type=int, default=256, help="Adaptive: upper bound on calls in flight (default: 256)")
+    load_group.add_argument("--duration", type=float, default=60.0, help="Seconds to keep issuing calls (default: 60)")
+    load_group.add_argument("--ramp-up", type=float, default=0.0, help="Seconds over which load ramps up linearly; not with --adaptive-p95 (default: 0)")
+    load_group.add_argument("--max-in-flight", type=int, default=1000, help="Open loop: drop calls beyond this many outstanding (default: 1000)")
+    load_group.add_argument("--pool-size", type=int, default=1, help="Server processes (stdio) or sessions (sse/http) to spread calls over (default: 1)")
+    load_group.add_argument("--tool-timeout", type=float, help="Seconds before a call is cancelled and counted as an error (default: no limit)")
+
+    parser.add_argument("-o", "--output", type=Path, help="Output file for load test report (default: stdout)")
+    parser.add_argument("--metrics-json", type=Path, help="Write load test statistics to this JSON file")
+
+    args = parser.parse_args()
+
+    if args.concurrency < 1 or (args.qps is not None and args.qps <= 0):
+        print("Error: --concurrency and --qps must be positive")
+        sys.exit(1)
+
+    if (args.adaptive_p95 is not None and args.adaptive_p95 <= 0) or args.adaptive_max < 1:
+        print("Error: --adaptive-p95 and --adaptive-max must be positive")
+        sys.exit(1)
+
+    if args.adaptive_p95 and args.ramp_up:
+        # The adaptive limit starts at 1 and ramps itself up.
+        print("Error: --ramp-up cannot be combined with --adaptive-p95")
+        sys.exit(1)
+
+    for path in args.trace_files:
+        if not path.exists():
+            print(f"Error: Trace file not found: {path}")
+            sys.exit(1)
+
+    try:
+        connection = create_connection(
+            transport=args.transport,
+            command=args.command,
+            args=args.args,
+            env=parse_env_vars(args.env) if args.env else None,
+            url=args.url,
+            headers=parse_headers(args.headers) if args.headers else None,
+            pool_size=args.pool_size,
+            call_timeout=args.tool_timeout,
+            raise_tool_errors=True,
+            # Reconnect after a crash, but count every failed call as an error.
+            call_retries=0,
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    pool_note = f" with a pool of {args.pool_size}" if args.pool_size > 1 else ""
+    print(f"🔗 Connecting to MCP server via {args.transport}{pool_note}...")
+
+    async with connection:
+        print("✅ Connected successfully")
+        try:
+            report = await run_load_test(
+                args.trace_files,
+                connection,
+                qps=args.qps,
+                concurrency=args.concurrency,
+                duration=args.duration,
+                ramp_up=args.ramp_up,
+                max_in_flight=args.max_in_flight,
+                metrics_path=args.metrics_json,
+                controller=(
+                    AdaptiveConcurrency(args.adaptive_p95, args.adaptive_error_rate, max_limit=args.adaptive_max)
+                    if args.adaptive_p95 else None
+                ),
+            )
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+    if args.output:
+        args.output.write_text(report)
+        print(f"\n✅ Report saved to {args.output}")
+    else:
+        print("\n" + report)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
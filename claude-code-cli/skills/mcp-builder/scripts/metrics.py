@@ -0,0 +1,305 @@
+"""Latency and token usage metrics for evaluation runs."""
+
+import math
+from collections.abc import Iterable
+from typing import Any
+
+from trials import pass_at_k, pass_hat_k
+
+PHASES = ("queue", "model", "tool", "overhead")
+# Per-turn timings of streamed responses: to first content, to the first complete
+# tool_use block, and from that block to the end of the response.
+STREAM_TIMINGS = ("ttft", "first_tool_use", "head_start")
+TOKEN_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+# Rough characters-per-token ratio, used when the API reports no usage.
+CHARS_PER_TOKEN = 4
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Return the q-th percentile (0-100) of already sorted values, interpolating linearly."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def latency_summary(values: Iterable[float]) -> dict[str, float]:
+    """Summarize durations as count, mean, p50, p90, p99 and max."""
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) if ordered else 0.0,
+        "p50": percentile(ordered, 50),
+        "p90": percentile(ordered, 90),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1] if ordered else 0.0,
+    }
+
+
+def usage_tokens(usage: Any) -> dict[str, int]:
+    """Extract token counts from a response's usage block (missing fields count as 0)."""
+    return {field: getattr(usage, field, None) or 0 for field in TOKEN_FIELDS}
+
+
+def context_tokens(tokens: dict[str, int]) -> int:
+    """Total prompt size of a turn, including cached input."""
+    return tokens["input_tokens"] + tokens["cache_creation_input_tokens"] + tokens["cache_read_input_tokens"]
+
+
+class TaskMetrics:
+    """Timing and token breakdown of a single task, recorded turn by turn by agent_loop.
+
+    A turn is one model call plus the tool calls it requested. Time in a turn
+    that is spent neither waiting on the model nor on tools is harness overhead.
+    Time the model call spent waiting for the rate limiter, or backing off
+    after a rejected request, is counted as queueing rather than model time.
+    Streamed turns also record time to first token and to the first tool use.
+
+    The tokens a tool result adds to the context are measured from the growth
+    in prompt size between consecutive turns, minus the previous turn's output,
+    and split across that turn's tool results by their length.
+    """
+
+    def __init__(self):
+        self.tool_calls: dict[str, dict[str, Any]] = {}
+        self.turns: list[dict[str, Any]] = []
+        self.tokens = dict.fromkeys(TOKEN_FIELDS, 0)
+        self.compactions: list[dict[str, int]] = []
+        self._last_context = None
+        self._last_output = 0
+        self._queue_s = 0.0
+        self._stream: dict[str, float] = {}
+        # (tool_name, index into its result_tokens, result length) awaiting attribution.
+        self._unattributed: list[tuple[str, int, int]] = []
+
+    def record_tool(self, tool_name: str, duration: float, result_chars: int = 0):
+        if tool_name not in self.tool_calls:
+            self.tool_calls[tool_name] = {"count": 0, "durations": [], "result_tokens": []}
+        metrics = self.tool_calls[tool_name]
+        metrics["count"] += 1
+        metrics["durations"].append(duration)
+        # Estimate until the next turn's usage lets us measure it.
+        metrics["result_tokens"].append(result_chars // CHARS_PER_TOKEN)
+        self._unattributed.append((tool_name, len(metrics["result_tokens"]) - 1, result_chars))
+
+    def record_usage(self, usage: Any) -> dict[str, int]:
+        """Add a turn's usage to the task totals and attribute pending tool results."""
+        tokens = usage_tokens(usage)
+        for field, count in tokens.items():
+            self.tokens[field] += count
+
+        context = context_tokens(tokens)
+        if self._unattributed and self._last_context is not None and context:
+            added = max(0, context - self._last_context - self._last_output)
+            total_chars = sum(chars for _, _, chars in self._unattributed)
+            for tool_name, index, chars in self._unattributed:
+                share = chars / total_chars if total_chars else 1 / len(self._unattributed)
+                self.tool_calls[tool_name]["result_tokens"][index] = round(added * share)
+        self._unattributed = []
+        self._last_context = context or None
+        self._last_output = tokens["output_tokens"]
+        return tokens
+
+    def record_queue(self, seconds: float):
+        """Record time the current turn's model call spent queued or backing off."""
+        self._queue_s += seconds
+
+    def record_stream(self, ttft_s: float, first_tool_use_s: float | None = None, head_start_s: float | None = None):
+        """Record the current turn's streaming timings.
+
+        first_tool_use_s is None if the turn used no tools, and head_start_s
+        if none of its tool calls started before the response ended.
+        """
+        self._stream = {"ttft_s": ttft_s}
+        if first_tool_use_s is not None:
+            self._stream["first_tool_use_s"] = first_tool_use_s
+        if head_start_s is not None:
+            self._stream["head_start_s"] = head_start_s
+
+    def record_compaction(self, stats: dict[str, int]):
+        """Record one context compaction pass and forget the pre-compaction prompt size."""
+        self.compactions.append(stats)
+        # The prompt shrank, so the next growth measurement would be misleading.
+        self._last_context = None
+
+    def record_turn(
+        self,
+        model_s: float,
+        tool_s: float,
+        total_s: float,
+        num_tools: int = 0,
+        tokens: dict[str, int] | None = None,
+    ):
+        """Record a finished turn; model_s includes any queueing recorded since the last turn.
+
+        For a streamed turn, tool_s is only the tool time left after the
+        response ended; the head start is the time tools ran before that.
+        """
+        queue_s, self._queue_s = self._queue_s, 0.0
+        stream, self._stream = self._stream, {}
+        self.turns.append({
+            "num_tools": num_tools,
+            "queue_s": queue_s,
+            "model_s": max(0.0, model_s - queue_s),
+            "tool_s": tool_s,
+            "overhead_s": max(0.0, total_s - model_s - tool_s),
+            **stream,
+            **(tokens or {}),
+        })
+
+    def phase_totals(self, total_duration: float) -> dict[str, float]:
+        """Split a task's wall time into queue, model, tool and overhead seconds."""
+        queue_s = sum(turn["queue_s"] for turn in self.turns)
+        model_s = sum(turn["model_s"] for turn in self.turns)
+        tool_s = sum(turn["tool_s"] for turn in self.turns)
+        return {
+            "queue_s": queue_s,
+            "model_s": model_s,
+            "tool_s": tool_s,
+            "overhead_s": max(0.0, total_duration - queue_s - model_s - tool_s),
+        }
+
+
+class RunMetrics:
+    """Aggregates task results into run-level latency and token statistics."""
+
+    def __init__(self):
+        self.tasks = 0
+        self.correct = 0
+        self.statuses: dict[str, int] = {}
+        self.total_tool_calls = 0
+        self.wall_time = 0.0
+        self.task_durations: list[float] = []
+        self.phases: dict[str, list[float]] = {phase: [] for phase in PHASES}
+        self.stream_timings: dict[str, list[float]] = {timing: [] for timing in STREAM_TIMINGS}
+        self.tools: dict[str, list[float]] = {}
+        self.tool_result_tokens: dict[str, list[int]] = {}
+        self.tokens = dict.fromkeys(TOKEN_FIELDS, 0)
+        self.compaction = {"passes": 0, "saved_tokens": 0, "superseded": 0, "truncated": 0}
+        # (trials run, trials passed, max trials) per question run with --trials.
+        self.trial_counts: list[tuple[int, int, int]] = []
+
+    def add(self, result: dict[str, Any]):
+        """Add one task result; for questions run with trials, durations and statuses count per trial."""
+        self.tasks += 1
+        self.correct += result["score"]
+        trials = result.get("trials")
+        for attempt in trials or [result]:
+            status = attempt.get("status", "completed")
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.task_durations.append(attempt["total_duration"])
+        if trials:
+            passes = sum(1 for trial in trials if trial["score"])
+            self.trial_counts.append((len(trials), passes, result["trial_summary"]["max_trials"]))
+        self.total_tool_calls += result["num_tool_calls"]
+        for turn in result.get("turns", []):
+            for phase in PHASES:
+                if phase == "tool" and not turn.get("num_tools"):
+                    continue
+                if f"{phase}_s" in turn:
+                    self.phases[phase].append(turn[f"{phase}_s"])
+            for timing in STREAM_TIMINGS:
+                if f"{timing}_s" in turn:
+                    self.stream_timings[timing].append(turn[f"{timing}_s"])
+        for tool_name, tool_metrics in result["tool_calls"].items():
+            self.tools.setdefault(tool_name, []).extend(tool_metrics["durations"])
+            self.tool_result_tokens.setdefault(tool_name, []).extend(tool_metrics.get("result_tokens", []))
+        for field, count in result.get("tokens", {}).items():
+            self.tokens[field] = self.tokens.get(field, 0) + count
+        for stats in result.get("compactions", []):
+            self.compaction["passes"] += 1
+            for field in ("saved_tokens", "superseded", "truncated"):
+                self.compaction[field] += stats[field]
+
+    def merge(self, other: "RunMetrics"):
+        """Add another run's tasks, e.g. to total several evaluation files; wall time is left to the caller."""
+        self.tasks += other.tasks
+        self.correct += other.correct
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        self.total_tool_calls += other.total_tool_calls
+        self.task_durations += other.task_durations
+        for phase, durations in other.phases.items():
+            self.phases[phase] += durations
+        for timing, durations in other.stream_timings.items():
+            self.stream_timings[timing] += durations
+        for tool_name, durations in other.tools.items():
+            self.tools.setdefault(tool_name, []).extend(durations)
+        for tool_name, counts in other.tool_result_tokens.items():
+            self.tool_result_tokens.setdefault(tool_name, []).extend(counts)
+        for field, count in other.tokens.items():
+            self.tokens[field] = self.tokens.get(field, 0) + count
+        for field, count in other.compaction.items():
+            self.compaction[field] += count
+        self.trial_counts += other.trial_counts
+
+    def token_summary(self) -> dict[str, Any]:
+        """Run totals, throughput and per-tool context contribution."""
+        total = sum(self.tokens.values())
+        model_time = sum(self.phases["model"])
+        context_total = context_tokens(self.tokens)
+        tools = {}
+        for tool_name, counts in sorted(self.tool_result_tokens.items()):
+            tools[tool_name] = {
+                "calls": len(counts),
+                "total": sum(counts),
+                "mean": sum(counts) / len(counts) if counts else 0.0,
+                "max": max(counts, default=0),
+                "share_of_context": sum(counts) / context_total if context_total else 0.0,
+            }
+        return {
+            **self.tokens,
+            "total_tokens": total,
+            "tokens_per_second": total / self.wall_time if self.wall_time else 0.0,
+            "output_tokens_per_model_second": self.tokens["output_tokens"] / model_time if model_time else 0.0,
+            "tokens_per_task": total / self.tasks if self.tasks else 0.0,
+            "tokens_per_correct_answer": total / self.correct if self.correct else None,
+            "tool_results": tools,
+            "compaction": self.compaction,
+        }
+
+    def trial_summary(self) -> dict[str, Any] | None:
+        """pass@1 with a 95% confidence interval, pass@k and pass^k over questions run with trials."""
+        if not self.trial_counts:
+            return None
+        k = max(max_trials for _, _, max_trials in self.trial_counts)
+        rates = [passes / runs for runs, passes, _ in self.trial_counts]
+        mean = sum(rates) / len(rates)
+        # Normal approximation over questions, which is where most of the variance is.
+        variance = sum((rate - mean) ** 2 for rate in rates) / (len(rates) - 1) if len(rates) > 1 else 0.0
+        margin = 1.96 * math.sqrt(variance / len(rates))
+        trials_run = sum(runs for runs, _, _ in self.trial_counts)
+        return {
+            "max_trials": k,
+            "questions": len(rates),
+            "trials_run": trials_run,
+            "trials_budget": len(rates) * k,
+            "pass@1": mean,
+            "pass@1_ci": [max(0.0, mean - margin), min(1.0, mean + margin)],
+            "pass@k": sum(pass_at_k(runs, passes, k) for runs, passes, _ in self.trial_counts) / len(rates),
+            "pass^k": sum(pass_hat_k(runs, passes, k) for runs, passes, _ in self.trial_counts) / len(rates),
+        }
+
+    def to_dict(self) -> dict[str, Any]:
+        """Machine-readable summary of the run."""
+        return {
+            "tasks": self.tasks,
+            "correct": self.correct,
+            "accuracy": self.correct / self.tasks if self.tasks else 0.0,
+            "statuses": self.statuses,
+            "total_tool_calls": self.total_tool_calls,
+            "wall_time": self.wall_time,
+            "task_duration": latency_summary(self.task_durations),
+            "phases": {phase: latency_summary(durations) for phase, durations in self.phases.items()},
+            "streaming": {
+                timing: latency_summary(durations) for timing, durations in self.stream_timings.items()
+            } if self.stream_timings["ttft"] else None,
+            "tools": {name: latency_summary(durations) for name, durations in sorted(self.tools.items())},
+            # Every call of every tool, unlike the tool phase, which counts a turn's parallel calls once.
+            "tool_calls": latency_summary([duration for durations in self.tools.values() for duration in durations]),
+            "tokens": self.token_summary(),
+            "trials": self.trial_summary(),
+        }
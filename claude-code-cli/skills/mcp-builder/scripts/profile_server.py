@@ -0,0 +1,104 @@
+"""Run a Python MCP server under a sampling profiler.
+
+Usage: python profile_server.py SAMPLES INTERVAL (SCRIPT | -m MODULE) [ARGS...]
+
+evaluation.py --profile launches Python stdio servers through this script.
+A daemon thread samples the Python stacks of all of the server's threads
+(its event loop and any worker threads running sync tools) every INTERVAL
+seconds. Samples are appended to SAMPLES as JSON lines: each distinct stack
+once, as {"id": ..., "frames": [root, ..., leaf]}, and each sample as
+{"t": wall-clock time, "s": [stack id of each thread]}. The file is flushed a few times a
+second, so samples survive the server being killed.
+
+This script must not import anything from the evaluation harness: it runs
+inside the server process, with the server's own interpreter.
+"""
+
+import atexit
+import json
+import os
+import runpy
+import sys
+import threading
+import time
+
+FLUSH_INTERVAL = 0.2
+_LAUNCHER_FILES = {os.path.basename(__file__), "runpy.py", "<frozen runpy>"}
+
+
+def label(code) -> str:
+    """Name a function the way pstats does: file:first line(function)."""
+    return f"{code.co_filename}:{code.co_firstlineno}({code.co_name})"
+
+
+class Sampler:
+    """Samples every other thread's stack on a daemon thread."""
+
+    def __init__(self, path: str, interval: float):
+        self.interval = interval
+        self._file = open(path, "a", encoding="utf-8")
+        self._stacks: dict[tuple, int] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _stack_id(self, frame) -> int:
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        key = tuple(codes)
+        stack_id = self._stacks.get(key)
+        if stack_id is None:
+            stack_id = self._stacks[key] = len(self._stacks)
+            frames = [label(code) for code in reversed(codes)]
+            # Drop this launcher and runpy from the root of every stack.
+            while frames and os.path.basename(frames[0].rsplit(":", 1)[0]) in _LAUNCHER_FILES:
+                frames.pop(0)
+            self._file.write(json.dumps({"id": stack_id, "frames": frames}) + "\n")
+        return stack_id
+
+    def _sample(self):
+        now = time.time()
+        me = threading.get_ident()
+        stack_ids = [self._stack_id(frame) for thread, frame in sys._current_frames().items() if thread != me]
+        self._file.write(json.dumps({"t": now, "s": stack_ids}) + "\n")
+
+    def run(self):
+        flushed = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if self._closed:
+                    return
+                self._sample()
+                if time.monotonic() - flushed >= FLUSH_INTERVAL:
+                    self._file.flush()
+                    flushed = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._file.close()
+
+
+def main():
+    if len(sys.argv) < 4:
+        sys.exit(__doc__.split("\n\n")[1])
+    samples_path, interval, *target = sys.argv[1:]
+
+    sampler = Sampler(samples_path, float(interval))
+    atexit.register(sampler.close)
+    threading.Thread(target=sampler.run, name="mcp-profiler", daemon=True).start()
+
+    if target[0] == "-m":
+        sys.argv = target[1:]
+        sys.path[0] = os.getcwd()
+        runpy.run_module(target[1], run_name="__main__", alter_sys=True)
+    else:
+        sys.argv = target
+        sys.path[0] = os.path.dirname(os.path.abspath(target[0]))
+        runpy.run_path(target[0], run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
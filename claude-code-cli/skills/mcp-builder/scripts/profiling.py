@@ -0,0 +1,281 @@
+"""Sampling profiles of Python stdio MCP servers, attributed to tool calls.
+
+With a ServerProfiler, every stdio server process is launched through
+profile_server.py, which samples the Python stacks of all the server's
+threads into its own file. Each connection logs when its tool calls start
+and end (in wall-clock time, which the server samples use too). After the
+run, every sample is attributed to the calls its connection had in flight
+at that moment, split evenly between concurrent calls, so a slow tool can
+be traced to the server code it spends its time in, or to none of it.
+
+A thread whose innermost frame is the event loop's selector, a lock or
+queue wait, or an idle thread-pool worker (which is how the stdio transport
+blocks reading stdin) is waiting, e.g. on I/O or the next request. A sample
+is busy if any thread is running code, and hot functions are ranked over
+the busy threads of busy samples only.
+"""
+
+import json
+import os
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+LAUNCHER = Path(__file__).with_name("profile_server.py")
+
+# Innermost frames of a thread waiting for something to happen: the asyncio
+# event loop's selector, and lock, condition and queue waits.
+IDLE_FILES = ("selectors.py", "windows_events.py", "threading.py", "queue.py")
+
+
+def is_python_command(command: str) -> bool:
+    """Whether a stdio server command looks like a Python interpreter."""
+    return os.path.realpath(command) == os.path.realpath(sys.executable) or re.fullmatch(
+        r"python[\d.]*(\.exe)?", os.path.basename(command)
+    ) is not None
+
+
+def split_interpreter_options(args: list[str]) -> tuple[list[str], list[str]]:
+    """Split a Python command's arguments into interpreter options and what they run.
+
+    The second part starts at the script or at -m MODULE, so the options
+    (e.g. -u, -X dev, -W error) can go before profile_server.py instead of
+    being taken for the server. Raises ValueError if there is no script or
+    module, e.g. with -c or a script read from stdin.
+    """
+    error = ValueError("Profiling needs a server script or -m MODULE in the Python arguments")
+    i = 0
+    while i < len(args) and args[i].startswith("-") and args[i] != "-":
+        arg = args[i]
+        i += 1
+        if arg == "--":
+            break
+        if arg.startswith("--"):
+            # Of the long options, only --check-hash-based-pycs takes a value.
+            i += arg == "--check-hash-based-pycs"
+            continue
+        flags = arg[1:]
+        for j, flag in enumerate(flags):
+            if flag == "c":
+                raise error
+            if flag == "m":
+                # -m MODULE or -mMODULE ends the options, also after flags, as in -um.
+                options = args[:i - 1] + ([arg[:j + 1]] if j else [])
+                module = flags[j + 1:]
+                if not module and i == len(args):
+                    raise error
+                return options, ["-m", module, *args[i:]] if module else ["-m", *args[i:]]
+            if flag in "XW":
+                # The value is the rest of this argument, or the next one.
+                i += j == len(flags) - 1
+                break
+    if i >= len(args) or args[i] == "-":
+        raise error
+    return args[:i], args[i:]
+
+
+def is_idle(frames: list[str]) -> bool:
+    """Whether a sampled thread is waiting rather than running code."""
+    if not frames:
+        return True
+    path, _, function = frames[-1].rpartition(":")
+    if os.path.basename(path) in IDLE_FILES:
+        return True
+    # An anyio worker thread blocked in a C call, e.g. reading stdin for the stdio transport.
+    return "anyio" in Path(path).parts and function.endswith("(run)")
+
+
+def short_label(frame: str) -> str:
+    """Shorten file:line(function) to the file's last two path components."""
+    path, _, rest = frame.rpartition(":")
+    return f"{'/'.join(Path(path).parts[-2:])}:{rest}"
+
+
+class ServerProfile:
+    """Sample file and tool-call log of one server process."""
+
+    def __init__(self, samples_path: Path, interval: float):
+        self.samples_path = samples_path
+        self.interval = interval
+        # (tool name, start, end) in wall-clock seconds.
+        self.calls: list[tuple[str, float, float]] = []
+
+    def launch_args(self, args: list[str]) -> list[str]:
+        """Arguments that run the server's own arguments under profile_server.py, after any interpreter options."""
+        options, target = split_interpreter_options(args)
+        return [*options, str(LAUNCHER), str(self.samples_path), str(self.interval), *target]
+
+    def record_call(self, tool_name: str, start: float, end: float):
+        self.calls.append((tool_name, start, end))
+
+    def read_samples(self, since: float = 0.0) -> list[tuple[float, list[list[str]]]]:
+        """(time, frames of each thread) of every sample taken since the given time, in time order."""
+        stacks: dict[int, list[str]] = {}
+        samples = []
+        try:
+            with open(self.samples_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if "frames" in record:
+                        stacks[record["id"]] = record["frames"]
+                    elif record.get("t", 0.0) >= since:
+                        samples.append((record["t"], [stacks[stack_id] for stack_id in record["s"] if stack_id in stacks]))
+        except FileNotFoundError:
+            pass
+        samples.sort(key=lambda sample: sample[0])
+        return samples
+
+
+class ServerProfiler:
+    """Profiles every Python stdio server process a connection starts.
+
+    Args:
+        directory: Where sample files and per-tool collapsed stacks go
+        interval: Seconds between samples
+    """
+
+    def __init__(self, directory: Path, interval: float = 0.005):
+        self.directory = Path(directory)
+        self.interval = interval
+        self.profiles: list[ServerProfile] = []
+
+    def check(self, transport: str, command: str | None, args: list[str] | None = None):
+        """Raise ValueError unless the server can be profiled."""
+        if transport != "stdio" or not command or not is_python_command(command):
+            raise ValueError("Profiling requires a Python stdio server, e.g. -c python -a server.py")
+        split_interpreter_options(args or [])
+
+    def new_profile(self) -> ServerProfile:
+        """Profile for one more server process."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile = ServerProfile(self.directory / f"server{len(self.profiles)}.samples.jsonl", self.interval)
+        # Samples from an earlier run into the same directory.
+        profile.samples_path.unlink(missing_ok=True)
+        self.profiles.append(profile)
+        return profile
+
+    def summarize(self, since: float = 0.0, top: int = 10, name: str | None = None) -> dict[str, Any]:
+        """Attribute samples taken since the given time to tool calls and rank hot functions per tool.
+
+        Writes each tool's busy stacks to DIRECTORY/NAME/TOOL.folded (or
+        DIRECTORY/TOOL.folded without a name), in the collapsed format flame
+        graph tools read. Naming each summary, e.g. after its evaluation
+        file, keeps runs over one connection from overwriting each other's.
+        """
+        folded_dir = self.directory / name if name else self.directory
+        tools: dict[str, dict[str, Any]] = {}
+        outside = {"samples": 0.0, "busy": 0.0}
+        total_samples = 0
+
+        for profile in self.profiles:
+            calls = sorted((call for call in profile.calls if call[2] >= since), key=lambda call: call[1])
+            for tool_name, _, _ in calls:
+                tools.setdefault(tool_name, {"calls": 0, "samples": 0.0, "busy": 0.0, "self": Counter(), "total": Counter(), "stacks": Counter()})
+                tools[tool_name]["calls"] += 1
+
+            # Sweep samples and calls in time order, tracking the calls in flight.
+            in_flight: list[tuple[str, float, float]] = []
+            next_call = 0
+            for t, threads in profile.read_samples(since):
+                total_samples += 1
+                while next_call < len(calls) and calls[next_call][1] <= t:
+                    in_flight.append(calls[next_call])
+                    next_call += 1
+                in_flight = [call for call in in_flight if call[2] >= t]
+                busy_threads = [frames for frames in threads if not is_idle(frames)]
+                if not in_flight:
+                    outside["samples"] += 1
+                    outside["busy"] += bool(busy_threads)
+                    continue
+                weight = 1 / len(in_flight)
+                for tool_name, _, _ in in_flight:
+                    stats = tools[tool_name]
+                    stats["samples"] += weight
+                    if not busy_threads:
+                        continue
+                    stats["busy"] += weight
+                    thread_weight = weight / len(busy_threads)
+                    for frames in busy_threads:
+                        stats["self"][frames[-1]] += thread_weight
+                        for frame in set(frames):
+                            stats["total"][frame] += thread_weight
+                        stats["stacks"][";".join(short_label(frame) for frame in frames)] += thread_weight
+
+        summary_tools = {}
+        for tool_name, stats in sorted(tools.items()):
+            folded_path = None
+            if stats["stacks"]:
+                slug = re.sub(r"[^\w.-]+", "_", tool_name)
+                folded_dir.mkdir(parents=True, exist_ok=True)
+                folded_path = folded_dir / f"{slug}.folded"
+                folded_path.write_text("".join(
+                    f"{stack} {max(1, round(count))}\n" for stack, count in stats["stacks"].most_common()
+                ))
+            busy = stats["busy"]
+            summary_tools[tool_name] = {
+                "calls": stats["calls"],
+                "samples": stats["samples"],
+                "busy_samples": busy,
+                "busy_share": busy / stats["samples"] if stats["samples"] else 0.0,
+                "hot_functions": [
+                    {"function": frame, "self": count / busy, "total": stats["total"][frame] / busy}
+                    for frame, count in stats["self"].most_common(top)
+                ],
+                "folded": str(folded_path) if folded_path else None,
+            }
+        return {
+            "directory": str(folded_dir),
+            "interval": self.interval,
+            "processes": len(self.profiles),
+            "samples": total_samples,
+            "outside_calls": outside,
+            "tools": summary_tools,
+        }
+
+
+PROFILE_SECTION = """
+## Server Profile
+
+The server's threads were sampled every {interval_ms:g} ms or so in {processes} process(es), {samples} samples in all. Each sample is attributed to the tool calls in flight when it was taken, split evenly between concurrent calls. **Busy** is the share of a tool's samples in which the server was running code rather than waiting; a slow tool with little busy time is waiting on I/O or the transport, not on the server's code. Hot functions rank where busy samples were, by self time (innermost frame) with total time (anywhere on the stack). {outside_busy:.0f} busy samples fell outside any tool call.
+{tool_sections}
+"""
+
+PROFILE_TOOL = """
+### `{name}`
+
+{calls} calls, {samples:.0f} samples, {busy_share:.0%} busy{folded}
+
+| Function | Self | Total |
+|----------|------|-------|
+{rows}
+"""
+
+
+def profile_section(summary: dict[str, Any]) -> str:
+    """Render a ServerProfiler summary as a Markdown report section."""
+    tool_sections = []
+    for name, stats in summary["tools"].items():
+        rows = [
+            f"| `{short_label(function['function'])}` | {function['self']:.1%} | {function['total']:.1%} |"
+            for function in stats["hot_functions"]
+        ]
+        tool_sections.append(PROFILE_TOOL.format(
+            name=name,
+            calls=stats["calls"],
+            samples=stats["samples"],
+            busy_share=stats["busy_share"],
+            folded=f" ([collapsed stacks]({stats['folded']}))" if stats["folded"] else "",
+            rows="\n".join(rows) or "| _no busy samples_ | | |",
+        ))
+    return PROFILE_SECTION.format(
+        interval_ms=summary["interval"] * 1000,
+        processes=summary["processes"],
+        samples=summary["samples"],
+        outside_busy=summary["outside_calls"]["busy"],
+        tool_sections="".join(tool_sections) or "\n_No tool calls were profiled._\n",
+    )
@@ -0,0 +1,186 @@
+"""Client-side rate limiting and retries for model requests.
+
+All tasks share one RateLimiter, so raising concurrency fills the API's
+requests-per-minute and tokens-per-minute budgets instead of overrunning
+them. Requests that are rejected anyway (rate limited, overloaded or a
+transient network error) are retried with jittered exponential backoff,
+and a rate-limited response pauses every task until its retry-after hint
+has passed rather than letting them all hammer the API at once.
+"""
+
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+import anthropic
+
+from metrics import latency_summary, usage_tokens
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate_per_minute, holding at most burst_seconds' worth.
+
+    The API may enforce its per-minute limits over shorter intervals, so the
+    burst is kept well below a full minute's budget. Waiters are served in
+    arrival order. The level may go negative when a request turns out to
+    cost more than was reserved for it, which delays later requests until
+    the debt is repaid.
+    """
+
+    def __init__(self, rate_per_minute: float, burst_seconds: float = 10.0):
+        self.rate_per_minute = rate_per_minute
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float) -> float:
+        """Wait until amount (capped at capacity) is available, take it and return what was taken."""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return amount
+                await asyncio.sleep((amount - self.level) / self.rate)
+
+    def adjust(self, amount: float):
+        """Take (or, if negative, return) amount without waiting; the level never exceeds capacity."""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+def retry_after(error: Exception) -> float | None:
+    """Seconds the API asked us to wait before retrying, if it said."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                return float(value)
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed request may succeed if sent again (as the API client itself decides)."""
+    if isinstance(error, anthropic.APIConnectionError):
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+class RateLimiter:
+    """Shared request scheduler enforcing per-minute budgets, with retries.
+
+    Args:
+        requests_per_minute: Request budget (default: unlimited)
+        tokens_per_minute: Token budget covering uncached input, cache
+            writes and output (default: unlimited)
+        max_retries: Retries per request before giving up
+        base_delay: Backoff before the first retry, doubled on each retry
+        max_delay: Upper bound on a single backoff
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        max_retries: int = 8,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._paused_until = 0.0
+        self.waits: list[float] = []
+        self.retries = 0
+        self.rate_limited = 0
+        self.backoff_s = 0.0
+
+    async def _admit(self, estimated_tokens: int) -> float:
+        """Wait out any pause and the budgets; returns the tokens actually charged."""
+        while (delay := self._paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+        if self.requests is not None:
+            await self.requests.acquire(1)
+        if self.tokens is not None:
+            return await self.tokens.acquire(estimated_tokens)
+        return 0.0
+
+    def _backoff(self, error: Exception, attempt: int) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        hint = retry_after(error)
+        if hint is not None:
+            # Spread retries just past the hint so they do not all land at once.
+            delay = min(self.max_delay, hint) + random.uniform(0, self.base_delay)
+        if isinstance(error, anthropic.RateLimitError):
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    async def run(self, send: Callable[[], Awaitable[Any]], estimated_tokens: int = 0) -> tuple[Any, float]:
+        """Send a request once the budgets allow it, retrying retryable failures.
+
+        Returns the response and the seconds spent queued or backing off.
+        The token budget is charged estimated_tokens (capped at the bucket's
+        capacity) up front and corrected with the response's actual usage.
+        """
+        waited = 0.0
+        for attempt in range(self.max_retries + 1):
+            queued_at = time.perf_counter()
+            charged = await self._admit(estimated_tokens)
+            waited += time.perf_counter() - queued_at
+            try:
+                response = await send()
+            except Exception as e:
+                if self.tokens is not None:
+                    self.tokens.adjust(-charged)
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(e, attempt)
+                self.retries += 1
+                self.backoff_s += delay
+                await asyncio.sleep(delay)
+                waited += delay
+                continue
+
+            if self.tokens is not None:
+                tokens = usage_tokens(getattr(response, "usage", None))
+                used = tokens["input_tokens"] + tokens["cache_creation_input_tokens"] + tokens["output_tokens"]
+                self.tokens.adjust(used - charged)
+            self.waits.append(waited)
+            return response, waited
+
+    def stats(self) -> dict[str, Any]:
+        """Budgets, retry counters and the distribution of per-request queueing delay."""
+        return {
+            "requests_per_minute": self.requests.rate_per_minute if self.requests else None,
+            "tokens_per_minute": self.tokens.rate_per_minute if self.tokens else None,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "backoff_s": self.backoff_s,
+            "queue_delay": latency_summary(self.waits),
+        }
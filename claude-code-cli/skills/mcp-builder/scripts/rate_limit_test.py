@@ -0,0 +1,123 @@
+import asyncio
+import time
+import unittest
+from email.utils import formatdate
+from types import SimpleNamespace
+
+import anthropic
+
+from rate_limit import RateLimiter, TokenBucket, retry_after
+
+
+def api_error(cls, status_code, headers=None):
+    """Helper to build an API error carrying the given response headers"""
+    request = SimpleNamespace(method="POST", url="https://api.anthropic.com/v1/messages")
+    response = SimpleNamespace(status_code=status_code, headers=headers or {}, request=request)
+    return cls("error", response=response, body=None)
+
+
+def usage_response(input_tokens, output_tokens):
+    """Helper to build a response with a usage block"""
+    return SimpleNamespace(usage=SimpleNamespace(input_tokens=input_tokens, output_tokens=output_tokens))
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_oversized_request_is_capped_at_capacity(self):
+        """A request larger than the bucket takes a full bucket instead of waiting forever"""
+        bucket = TokenBucket(60)  # 1 token/s, 10 token burst
+        taken = asyncio.run(asyncio.wait_for(bucket.acquire(100), 1))
+        self.assertEqual(taken, bucket.capacity)
+        self.assertLess(bucket.level, 1)
+
+    def test_refund_never_exceeds_capacity(self):
+        """Returning tokens fills the bucket no further than its capacity"""
+        bucket = TokenBucket(60)
+        bucket.adjust(-1000)
+        self.assertEqual(bucket.level, bucket.capacity)
+
+    def test_debt_delays_later_requests(self):
+        """Charging more than the level leaves it negative"""
+        bucket = TokenBucket(60)
+        bucket.adjust(15)
+        self.assertLess(bucket.level, 0)
+
+
+class TestRetryAfter(unittest.TestCase):
+
+    def test_milliseconds_header(self):
+        error = api_error(anthropic.RateLimitError, 429, {"retry-after-ms": "1500"})
+        self.assertAlmostEqual(retry_after(error), 1.5)
+
+    def test_seconds_header(self):
+        error = api_error(anthropic.RateLimitError, 429, {"retry-after": "7"})
+        self.assertAlmostEqual(retry_after(error), 7.0)
+
+    def test_http_date_header(self):
+        error = api_error(anthropic.RateLimitError, 429, {"retry-after": formatdate(time.time() + 30, usegmt=True)})
+        self.assertTrue(25 <= retry_after(error) <= 31)
+
+    def test_missing_or_malformed_header(self):
+        self.assertIsNone(retry_after(api_error(anthropic.RateLimitError, 429)))
+        self.assertIsNone(retry_after(api_error(anthropic.RateLimitError, 429, {"retry-after": "soon"})))
+        self.assertIsNone(retry_after(ValueError("no response")))
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_refund_on_failure(self):
+        """A failed request gives back what it was charged, even when the estimate was oversized"""
+        limiter = RateLimiter(tokens_per_minute=60, max_retries=0)
+
+        async def send():
+            raise ValueError("not retryable")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(limiter.run(send, estimated_tokens=100))
+        self.assertAlmostEqual(limiter.tokens.level, limiter.tokens.capacity, places=3)
+
+    def test_usage_correction_after_oversized_estimate(self):
+        """The budget ends up charged the actual usage, not the difference from the uncapped estimate"""
+        limiter = RateLimiter(tokens_per_minute=60)
+
+        async def send():
+            return usage_response(3, 2)
+
+        asyncio.run(limiter.run(send, estimated_tokens=100))
+        self.assertAlmostEqual(limiter.tokens.level, limiter.tokens.capacity - 5, places=1)
+
+    def test_retry_after_rate_limit(self):
+        """A rate-limited request waits out the retry-after hint, then succeeds"""
+        limiter = RateLimiter(requests_per_minute=600, base_delay=0.01)
+        attempts = []
+
+        async def send():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise api_error(anthropic.RateLimitError, 429, {"retry-after-ms": "50"})
+            return usage_response(1, 1)
+
+        response, waited = asyncio.run(limiter.run(send))
+        self.assertEqual(response.usage.input_tokens, 1)
+        self.assertEqual(len(attempts), 2)
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.05)
+        self.assertGreaterEqual(waited, 0.05)
+        self.assertEqual(limiter.retries, 1)
+        self.assertEqual(limiter.rate_limited, 1)
+
+    def test_non_retryable_error_is_raised_immediately(self):
+        limiter = RateLimiter()
+        attempts = []
+
+        async def send():
+            attempts.append(1)
+            raise api_error(anthropic.BadRequestError, 400)
+
+        with self.assertRaises(anthropic.BadRequestError):
+            asyncio.run(limiter.run(send))
+        self.assertEqual(len(attempts), 1)
+        self.assertEqual(limiter.retries, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
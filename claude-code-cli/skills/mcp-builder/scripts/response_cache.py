@@ -0,0 +1,174 @@
+"""Content-addressed record/replay cache for model responses.
+
+Responses are keyed by a hash of the full request (model, system prompt,
+tools and messages), so a re-run only pays for turns whose conversation
+prefix actually changed.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+CACHE_MODES = ("record", "replay", "read-through")
+
+# Each record is: payload length (4 bytes), sha256 key (32 bytes), zlib-compressed JSON payload.
+_RECORD_HEADER = struct.Struct(">I32s")
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def to_jsonable(value: Any) -> Any:
+    """Convert SDK objects (pydantic models) nested in value to plain JSON types."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    return value
+
+
+def request_key(request: dict[str, Any]) -> str:
+    """Hash a messages.create request into a stable cache key."""
+    canonical = json.dumps(to_jsonable(request), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Append-only on-disk store of model responses.
+
+    All records live in a single log file; an in-memory index maps each key
+    to the offset of its latest record. When the file grows past max_bytes
+    it is compacted, keeping the most recently used entries.
+    """
+
+    def __init__(self, path: Path, mode: str = "read-through", max_bytes: int = 512 * 1024 * 1024):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unsupported cache mode: {mode}. Use one of {', '.join(CACHE_MODES)}")
+        self.path = Path(path)
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._index: OrderedDict[bytes, tuple[int, int]] = OrderedDict()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a+b")
+        self._load()
+
+    def _load(self):
+        """Rebuild the index from the log, dropping a torn trailing record."""
+        self._file.seek(0)
+        offset = 0
+        while True:
+            header = self._file.read(_RECORD_HEADER.size)
+            if len(header) < _RECORD_HEADER.size:
+                break
+            length, key = _RECORD_HEADER.unpack(header)
+            if len(self._file.read(length)) < length:
+                break
+            self._index[key] = (offset + _RECORD_HEADER.size, length)
+            self._index.move_to_end(key)
+            offset += _RECORD_HEADER.size + length
+        if offset < self._file.seek(0, os.SEEK_END):
+            self._file.truncate(offset)
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Return the cached response payload for key, or None."""
+        digest = bytes.fromhex(key)
+        location = self._index.get(digest)
+        if location is None:
+            self.misses += 1
+            return None
+        self._index.move_to_end(digest)
+        self.hits += 1
+        offset, length = location
+        self._file.seek(offset)
+        return json.loads(zlib.decompress(self._file.read(length)))
+
+    def put(self, key: str, payload: dict[str, Any]):
+        """Append a response payload for key, evicting old entries if needed."""
+        digest = bytes.fromhex(key)
+        data = zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        offset = self._file.seek(0, os.SEEK_END)
+        self._file.write(_RECORD_HEADER.pack(len(data), digest) + data)
+        self._file.flush()
+        self._index[digest] = (offset + _RECORD_HEADER.size, len(data))
+        self._index.move_to_end(digest)
+
+        if offset + _RECORD_HEADER.size + len(data) > self.max_bytes:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the log with the most recently used entries that fit in 3/4 of max_bytes."""
+        budget = self.max_bytes * 3 // 4
+        keep = []
+        size = 0
+        for digest, (offset, length) in reversed(self._index.items()):
+            if size + _RECORD_HEADER.size + length > budget:
+                break
+            keep.append((digest, offset, length))
+            size += _RECORD_HEADER.size + length
+
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        index = OrderedDict()
+        with open(tmp_path, "wb") as out:
+            for digest, offset, length in reversed(keep):
+                self._file.seek(offset)
+                data = self._file.read(length)
+                index[digest] = (out.tell() + _RECORD_HEADER.size, length)
+                out.write(_RECORD_HEADER.pack(length, digest) + data)
+
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a+b")
+        self._index = index
+
+    def close(self):
+        """Close the underlying log file."""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ScopedResponseCache:
+    """View of a ResponseCache whose keys are namespaced by scope.
+
+    Runs that share one cache file, such as the servers of a comparison,
+    each see only their own recordings, even for identical requests. Hits
+    and misses are counted per view.
+    """
+
+    def __init__(self, cache: ResponseCache, scope: str):
+        self.cache = cache
+        self.scope = scope
+        self.mode = cache.mode
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key: str) -> str:
+        return hashlib.sha256(f"{self.scope}\0{key}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Return the cached response payload for key in this scope, or None."""
+        payload = self.cache.get(self._key(key))
+        if payload is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return payload
+
+    def put(self, key: str, payload: dict[str, Any]):
+        """Append a response payload for key in this scope."""
+        self.cache.put(self._key(key), payload)
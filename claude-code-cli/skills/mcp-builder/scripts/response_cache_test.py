@@ -0,0 +1,105 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from response_cache import ResponseCache, ScopedResponseCache, request_key
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "cache.log"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_request_key_is_order_independent(self):
+        """Requests differing only in dict key order share a key"""
+        a = request_key({"model": "m", "messages": [{"role": "user", "content": "hi"}]})
+        b = request_key({"messages": [{"content": "hi", "role": "user"}], "model": "m"})
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, request_key({"model": "m", "messages": []}))
+
+    def test_round_trip(self):
+        """Entries put in one session are read back in the next"""
+        key = request_key({"model": "m", "messages": []})
+        payload = {"content": [{"type": "text", "text": "hello"}], "stop_reason": "end_turn"}
+        with ResponseCache(self.path) as cache:
+            cache.put(key, payload)
+            self.assertEqual(cache.get(key), payload)
+
+        with ResponseCache(self.path) as cache:
+            self.assertEqual(cache.get(key), payload)
+            self.assertIsNone(cache.get(request_key({"other": True})))
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_latest_record_wins(self):
+        key = request_key({"n": 1})
+        with ResponseCache(self.path) as cache:
+            cache.put(key, {"v": 1})
+            cache.put(key, {"v": 2})
+        with ResponseCache(self.path) as cache:
+            self.assertEqual(cache.get(key), {"v": 2})
+
+    def test_truncated_tail_is_dropped(self):
+        """A record torn by an interrupted run is discarded, keeping the ones before it"""
+        first, second = request_key({"n": 1}), request_key({"n": 2})
+        with ResponseCache(self.path) as cache:
+            cache.put(first, {"v": 1})
+            intact = self.path.stat().st_size
+            cache.put(second, {"v": 2, "padding": "x" * 100})
+        with open(self.path, "r+b") as f:
+            f.truncate(self.path.stat().st_size - 5)
+
+        with ResponseCache(self.path) as cache:
+            self.assertEqual(self.path.stat().st_size, intact)
+            self.assertEqual(cache.get(first), {"v": 1})
+            self.assertIsNone(cache.get(second))
+            # New records append cleanly after the truncated tail.
+            cache.put(second, {"v": 3})
+        with ResponseCache(self.path) as cache:
+            self.assertEqual(cache.get(second), {"v": 3})
+
+    def test_truncated_header_is_dropped(self):
+        key = request_key({"n": 1})
+        with ResponseCache(self.path) as cache:
+            cache.put(key, {"v": 1})
+            intact = self.path.stat().st_size
+        with open(self.path, "ab") as f:
+            f.write(b"\x00\x00")
+
+        with ResponseCache(self.path) as cache:
+            self.assertEqual(self.path.stat().st_size, intact)
+            self.assertEqual(cache.get(key), {"v": 1})
+
+    def test_compaction_keeps_recent_entries(self):
+        keys = [request_key({"n": n}) for n in range(20)]
+        with ResponseCache(self.path, max_bytes=1024) as cache:
+            for n, key in enumerate(keys):
+                cache.put(key, {"n": n, "padding": str(n) * 50})
+            self.assertLessEqual(self.path.stat().st_size, 1024)
+            self.assertEqual(cache.get(keys[-1])["n"], 19)
+            self.assertIsNone(cache.get(keys[0]))
+        with ResponseCache(self.path, max_bytes=1024) as cache:
+            self.assertEqual(cache.get(keys[-1])["n"], 19)
+
+    def test_scopes_do_not_share_entries(self):
+        key = request_key({"model": "m"})
+        with ResponseCache(self.path) as cache:
+            a, b = ScopedResponseCache(cache, "a"), ScopedResponseCache(cache, "b")
+            a.put(key, {"server": "a"})
+            self.assertIsNone(b.get(key))
+            self.assertIsNone(cache.get(key))
+            b.put(key, {"server": "b"})
+            self.assertEqual(a.get(key), {"server": "a"})
+            self.assertEqual(b.get(key), {"server": "b"})
+            self.assertEqual((a.hits, a.misses, b.hits, b.misses), (1, 0, 1, 1))
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            ResponseCache(self.path, mode="write-back")
+
+
+if __name__ == "__main__":
+    unittest.main()
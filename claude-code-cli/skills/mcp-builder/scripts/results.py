@@ -0,0 +1,103 @@
+"""Streaming storage for evaluation task results."""
+
+import json
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+
+class ResultSink:
+    """Append-only JSONL store of finished task results.
+
+    Each result is written and flushed as soon as its task completes, so an
+    interrupted run keeps everything finished so far and can be resumed.
+    Without a path, results are kept in memory instead.
+    """
+
+    def __init__(self, path: Path | None = None, resume: bool = False):
+        self.path = Path(path) if path else None
+        self._memory: list[dict[str, Any]] = []
+        self._file = None
+        # Maps task_index -> (question, byte offset of its latest record).
+        self._offsets: dict[int, tuple[str, int]] = {}
+
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if resume and self.path.exists():
+            self._load()
+        self._file = open(self.path, "ab" if resume else "wb")
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                if line.endswith(b"\n"):
+                    try:
+                        result = json.loads(line)
+                        self._offsets[result["task_index"]] = (result["question"], offset)
+                    except (ValueError, KeyError):
+                        pass
+                    offset += len(line)
+                else:
+                    # Torn final line from an interrupted write; drop it.
+                    break
+        with open(self.path, "r+b") as f:
+            f.truncate(offset)
+
+    def is_done(self, task_index: int, question: str) -> bool:
+        """Whether a result for this QA pair is already stored."""
+        entry = self._offsets.get(task_index)
+        return entry is not None and entry[0] == question
+
+    def __len__(self) -> int:
+        return len(self._offsets) if self.path else len(self._memory)
+
+    def write(self, result: dict[str, Any]):
+        """Store one finished task result."""
+        if self.path is None:
+            self._memory.append(result)
+            return
+        offset = self._file.tell()
+        self._file.write(json.dumps(result, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._file.flush()
+        self._offsets[result["task_index"]] = (result["question"], offset)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        """Yield stored results ordered by task index, reading one at a time."""
+        if self.path is None:
+            yield from sorted(self._memory, key=lambda result: result["task_index"])
+            return
+        with open(self.path, "rb") as f:
+            for _, (_, offset) in sorted(self._offsets.items()):
+                f.seek(offset)
+                yield json.loads(f.readline())
+
+    def close(self):
+        """Close the underlying file, if any."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_results(path: Path) -> list[dict[str, Any]]:
+    """Read a results file written by ResultSink without modifying it.
+
+    Returns the latest result per task index, ordered by task index. Torn
+    or malformed lines are skipped.
+    """
+    results: dict[int, dict[str, Any]] = {}
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+                results[result["task_index"]] = result
+            except (ValueError, KeyError, TypeError):
+                continue
+    return [results[index] for index in sorted(results)]
@@ -0,0 +1,74 @@
+"""Recording and reading of tool-call traces.
+
+A tool-call trace is a JSONL file with one line per tool call an evaluation
+made: the tool, its arguments, how long it took and whether it failed.
+loadtest.py replays these calls against a server without any model calls.
+"""
+
+import json
+import os
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any
+
+from traces import is_trace_file, iter_trace
+
+
+class ToolTraceWriter:
+    """Append-only JSONL writer for tool calls, flushed after every call.
+
+    The file is truncated unless append is set, as when resuming a run.
+    """
+
+    def __init__(self, path: Path, append: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a" if append else "w", encoding="utf-8")
+        if self._file.tell():
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # End a line torn by an interrupted run, so the next record is not glued to it.
+                    self._file.write("\n")
+
+    def write(self, call: dict[str, Any]):
+        """Append one tool call record."""
+        self._file.write(json.dumps(call, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+
+    def close(self):
+        """Close the underlying file."""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def iter_tool_calls(paths: Iterable[Path]) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Yield (tool name, arguments) for every call in the given trace files.
+
+    Accepts tool-call traces and turn traces written by traces.TraceWriter.
+    Tool-call trace lines may also use the Messages API tool_use shape
+    ("name" and "input"), so tool_use blocks extracted from elsewhere can be
+    replayed too. Blank and malformed lines, such as a torn final line, are
+    skipped.
+    """
+    for path in paths:
+        if is_trace_file(path):
+            for record in iter_trace(path):
+                if record["kind"] == "turn":
+                    for call in record["tool_calls"]:
+                        yield call["tool"], call["arguments"] or {}
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    call = json.loads(line)
+                except ValueError:
+                    continue
+                tool = call.get("tool", call.get("name"))
+                if tool:
+                    yield tool, call.get("arguments", call.get("input")) or {}
@@ -0,0 +1,138 @@
+"""Compact traces of every agent turn, for offline analysis.
+
+A trace file records, for each task, every turn's request hash, model
+response, tool calls (name, arguments, result size, duration) and timings,
+followed by a summary record once the task finishes. Records from
+concurrently running tasks interleave and carry their task_index (and
+trial, when each question is run several times).
+
+The file starts with a magic header and holds one zlib stream. Each record
+is a length-prefixed chunk of that stream, sync-flushed so it can be read
+back as soon as it is written; compressing all records as one stream lets
+repeated structure across turns compress well. Readers decompress chunk by
+chunk and stop at a torn final record. A resumed run appends a zero length
+and then its own zlib stream, opening with a "resume" record, so one file
+can hold several runs.
+"""
+
+import json
+import os
+import struct
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+MAGIC = b"MCPTRACE\x01"
+
+_LENGTH = struct.Struct(">I")
+
+
+class TraceWriter:
+    """Append records to a trace file, flushing each one to disk.
+
+    The file is started afresh unless append is set, as when resuming a run.
+    Appended records follow the complete records already in the file.
+    """
+
+    def __init__(self, path: Path, append: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if append and self.path.exists() and self.path.stat().st_size:
+            self._file = open(self.path, "r+b")
+            try:
+                # Cut off a record torn by the interrupted run.
+                self._file.truncate(_end_of_records(self._file))
+            except BaseException:
+                self._file.close()
+                raise
+            self._file.seek(0, os.SEEK_END)
+            self._file.write(_LENGTH.pack(0))
+        else:
+            self._file = open(self.path, "wb")
+            self._file.write(MAGIC)
+        self._compressor = zlib.compressobj(level=6)
+        if self._file.tell() > len(MAGIC):
+            self.write({"kind": "resume"})
+
+    def write(self, record: dict[str, Any]):
+        """Append one record (a turn or task summary)."""
+        data = json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+        chunk = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self._file.write(_LENGTH.pack(len(chunk)) + chunk)
+        self._file.flush()
+
+    def close(self):
+        """Close the underlying file."""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _end_of_records(f) -> int:
+    """Offset just past the last complete record of an open trace file."""
+    size = os.fstat(f.fileno()).st_size
+    f.seek(0)
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"Not a trace file: {f.name}")
+    end = len(MAGIC)
+    while True:
+        header = f.read(_LENGTH.size)
+        if len(header) < _LENGTH.size:
+            return end
+        (length,) = _LENGTH.unpack(header)
+        if end + _LENGTH.size + length > size:
+            return end
+        end += _LENGTH.size + length
+        f.seek(end)
+
+
+def is_trace_file(path: Path) -> bool:
+    """Whether path starts with the trace file magic header."""
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def iter_trace(path: Path) -> Iterator[dict[str, Any]]:
+    """Yield the records of a trace file in the order they were written, one at a time."""
+    decompressor = zlib.decompressobj()
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a trace file: {path}")
+        while True:
+            header = f.read(_LENGTH.size)
+            if len(header) < _LENGTH.size:
+                return
+            (length,) = _LENGTH.unpack(header)
+            if not length:
+                # A resumed run's records, in a stream of their own.
+                decompressor = zlib.decompressobj()
+                continue
+            chunk = f.read(length)
+            if len(chunk) < length:
+                return
+            yield json.loads(decompressor.decompress(chunk))
+
+
+def iter_task_traces(path: Path) -> Iterator[dict[str, Any]]:
+    """Yield one {"task": summary, "turns": [...]} dict per finished task (or trial).
+
+    Only turns of tasks that are still running are held in memory, so this
+    streams traces of any length. Tasks without a summary record (from an
+    interrupted run) are skipped, and are not mixed with their turns from
+    the run that resumed it.
+    """
+    turns: dict[tuple[int, int | None], list[dict[str, Any]]] = {}
+    for record in iter_trace(path):
+        if record["kind"] == "resume":
+            turns.clear()
+            continue
+        key = (record["task_index"], record.get("trial"))
+        if record["kind"] == "turn":
+            turns.setdefault(key, []).append(record)
+        elif record["kind"] == "task":
+            yield {"task": record, "turns": turns.pop(key, [])}
@@ -0,0 +1,116 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from traces import MAGIC, TraceWriter, is_trace_file, iter_task_traces, iter_trace
+
+
+def turn(task_index, n):
+    return {"kind": "turn", "task_index": task_index, "turn": n, "tool_calls": [{"name": "search", "duration": 0.1}]}
+
+
+def task(task_index):
+    return {"kind": "task", "task_index": task_index, "score": 1}
+
+
+class TestTraces(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "trace.bin"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        """Records are read back in the order they were written"""
+        records = [turn(0, 0), turn(1, 0), turn(0, 1), task(0), task(1)]
+        with TraceWriter(self.path) as trace:
+            for record in records:
+                trace.write(record)
+
+        self.assertTrue(is_trace_file(self.path))
+        self.assertEqual(list(iter_trace(self.path)), records)
+
+    def test_task_traces_group_interleaved_turns(self):
+        with TraceWriter(self.path) as trace:
+            for record in [turn(0, 0), turn(1, 0), turn(0, 1), task(0), task(1)]:
+                trace.write(record)
+
+        grouped = list(iter_task_traces(self.path))
+        self.assertEqual([g["task"]["task_index"] for g in grouped], [0, 1])
+        self.assertEqual([t["turn"] for t in grouped[0]["turns"]], [0, 1])
+        self.assertEqual(len(grouped[1]["turns"]), 1)
+
+    def test_records_readable_before_close(self):
+        """Each record is flushed, so a reader sees it while the writer is still open"""
+        with TraceWriter(self.path) as trace:
+            trace.write(turn(0, 0))
+            self.assertEqual(list(iter_trace(self.path)), [turn(0, 0)])
+
+    def test_truncated_tail_is_ignored(self):
+        """Readers stop at a record torn by an interrupted run"""
+        with TraceWriter(self.path) as trace:
+            trace.write(turn(0, 0))
+            trace.write(turn(0, 1))
+        with open(self.path, "r+b") as f:
+            f.truncate(self.path.stat().st_size - 3)
+
+        self.assertEqual(list(iter_trace(self.path)), [turn(0, 0)])
+
+    def test_append_after_truncated_tail(self):
+        """A resumed run cuts off the torn record and continues in a new stream"""
+        with TraceWriter(self.path) as trace:
+            trace.write(turn(0, 0))
+            trace.write(task(0))
+            trace.write(turn(1, 0))
+        with open(self.path, "r+b") as f:
+            f.truncate(self.path.stat().st_size - 3)
+
+        with TraceWriter(self.path, append=True) as trace:
+            trace.write(turn(1, 0))
+            trace.write(task(1))
+
+        self.assertEqual(
+            [r["kind"] for r in iter_trace(self.path)],
+            ["turn", "task", "resume", "turn", "task"],
+        )
+        grouped = list(iter_task_traces(self.path))
+        self.assertEqual([g["task"]["task_index"] for g in grouped], [0, 1])
+        self.assertEqual(len(grouped[1]["turns"]), 1)
+
+    def test_interrupted_task_is_not_mixed_with_resumed_run(self):
+        with TraceWriter(self.path) as trace:
+            trace.write(turn(0, 0))
+        with TraceWriter(self.path, append=True) as trace:
+            trace.write(turn(0, 0))
+            trace.write(task(0))
+
+        grouped = list(iter_task_traces(self.path))
+        self.assertEqual(len(grouped), 1)
+        self.assertEqual(len(grouped[0]["turns"]), 1)
+
+    def test_without_append_starts_afresh(self):
+        with TraceWriter(self.path) as trace:
+            trace.write(turn(0, 0))
+        with TraceWriter(self.path) as trace:
+            trace.write(turn(1, 0))
+
+        self.assertEqual(list(iter_trace(self.path)), [turn(1, 0)])
+
+    def test_not_a_trace_file(self):
+        self.path.write_bytes(b"not a trace")
+        self.assertFalse(is_trace_file(self.path))
+        with self.assertRaises(ValueError):
+            list(iter_trace(self.path))
+        with self.assertRaises(ValueError):
+            TraceWriter(self.path, append=True)
+
+    def test_empty_file_starts_with_magic(self):
+        TraceWriter(self.path).close()
+        self.assertEqual(self.path.read_bytes(), MAGIC)
+        self.assertEqual(list(iter_trace(self.path)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+"""Repeated trials per question, with sequential early stopping.
+
+A question's trials are Bernoulli samples of whether the agent answers it
+correctly. Rather than always running K of them, a sequential probability
+ratio test (SPRT) stops as soon as the evidence says the question is
+reliably passed (pass rate >= P_PASS) or reliably failed (<= P_FAIL), with
+error rates of at most ALPHA either way. Questions with mixed results keep
+sampling up to K, which is where the extra trials are informative.
+
+Trials run in parallel waves. Each wave is the fewest trials that could
+settle the question if they all agreed, so no trial is started that the
+test could not use.
+"""
+
+import asyncio
+import math
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+P_PASS = 0.8
+P_FAIL = 0.2
+ALPHA = 0.05
+
+_STEP_PASS = math.log(P_PASS / P_FAIL)
+_STEP_FAIL = math.log((1 - P_PASS) / (1 - P_FAIL))
+_UPPER = math.log((1 - ALPHA) / ALPHA)
+_LOWER = -_UPPER
+
+
+def log_likelihood_ratio(passes: int, fails: int) -> float:
+    """Evidence for a reliably passed over a reliably failed question."""
+    return passes * _STEP_PASS + fails * _STEP_FAIL
+
+
+def is_settled(passes: int, fails: int) -> bool:
+    """Whether the SPRT has decided the question either way."""
+    llr = log_likelihood_ratio(passes, fails)
+    return llr >= _UPPER or llr <= _LOWER
+
+
+def trials_to_settle(passes: int, fails: int) -> int:
+    """Fewest further trials that could settle the question, if they all agreed."""
+    llr = log_likelihood_ratio(passes, fails)
+    return max(1, min(math.ceil((_UPPER - llr) / _STEP_PASS), math.ceil((_LOWER - llr) / _STEP_FAIL)))
+
+
+def wilson_interval(successes: int, n: int, z: float = 1.96) -> tuple[float, float]:
+    """95% (by default) Wilson score interval for a pass rate."""
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z**2 / n
+    center = (p + z**2 / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def pass_at_k(n: int, c: int, k: int) -> float:
+    """Probability that at least one of k trials passes, from c passes in n.
+
+    Uses the unbiased estimator when n >= k, and otherwise (a question
+    stopped early) the plug-in estimate from its observed pass rate.
+    """
+    if n == 0:
+        return 0.0
+    if n >= k:
+        return 1.0 - math.comb(n - c, k) / math.comb(n, k)
+    return 1.0 - (1.0 - c / n) ** k
+
+
+def pass_hat_k(n: int, c: int, k: int) -> float:
+    """Probability that all of k trials pass (consistency), from c passes in n."""
+    if n == 0:
+        return 0.0
+    if n >= k:
+        return math.comb(c, k) / math.comb(n, k)
+    return (c / n) ** k
+
+
+async def run_trials(
+    run_trial: Callable[[int], Awaitable[dict[str, Any]]],
+    max_trials: int,
+    early_stop: bool = True,
+) -> list[dict[str, Any]]:
+    """Run up to max_trials of run_trial(trial_index), in parallel waves.
+
+    Each result's "score" counts as a pass if truthy. Without early_stop,
+    all max_trials run at once.
+    """
+    results: list[dict[str, Any]] = []
+    while len(results) < max_trials:
+        passes = sum(1 for result in results if result["score"])
+        fails = len(results) - passes
+        if early_stop and results and is_settled(passes, fails):
+            break
+        wave = max_trials - len(results)
+        if early_stop:
+            wave = min(wave, trials_to_settle(passes, fails))
+        start = len(results)
+        results += await asyncio.gather(*(run_trial(trial) for trial in range(start, start + wave)))
+    return results
+
+
+def merge_trials(trials: list[dict[str, Any]], max_trials: int) -> dict[str, Any]:
+    """Combine a question's trial results into one result.
+
+    Durations, phases, tokens and tool calls are summed over trials, so the
+    result shows what the question cost; the per-trial results are kept
+    under "trials". The score is the fraction of trials passed.
+    """
+    first = trials[0]
+    passed = [trial for trial in trials if trial["score"]]
+    shown = passed[0] if passed else first
+    passes = len(passed)
+
+    tool_calls: dict[str, dict[str, Any]] = {}
+    for trial in trials:
+        for name, metrics in trial["tool_calls"].items():
+            merged = tool_calls.setdefault(name, {"count": 0, "durations": [], "result_tokens": []})
+            merged["count"] += metrics["count"]
+            merged["durations"] += metrics["durations"]
+            merged["result_tokens"] += metrics.get("result_tokens", [])
+
+    statuses = {trial["status"] for trial in trials}
+    low, high = wilson_interval(passes, len(trials))
+    return {
+        "task_index": first["task_index"],
+        "status": statuses.pop() if len(statuses) == 1 else "mixed",
+        "question": first["question"],
+        "expected": first["expected"],
+        "actual": shown["actual"],
+        "score": passes / len(trials),
+        "total_duration": sum(trial["total_duration"] for trial in trials),
+        "phases": {
+            phase: sum(trial["phases"].get(phase, 0.0) for trial in trials) for phase in first["phases"]
+        },
+        "turns": [turn for trial in trials for turn in trial["turns"]],
+        "tokens": {field: sum(trial["tokens"].get(field, 0) for trial in trials) for field in first["tokens"]},
+        "compactions": [stats for trial in trials for stats in trial.get("compactions", [])],
+        "tool_calls": tool_calls,
+        "num_tool_calls": sum(trial["num_tool_calls"] for trial in trials),
+        "summary": shown["summary"],
+        "feedback": shown["feedback"],
+        "trial_summary": {
+            "trials": len(trials),
+            "max_trials": max_trials,
+            "passes": passes,
+            "pass_rate_ci": [low, high],
+            "settled": is_settled(passes, len(trials) - passes),
+        },
+        "trials": [
+            {field: trial[field] for field in ("trial", "status", "actual", "score", "total_duration", "tokens", "num_tool_calls")}
+            for trial in trials
+        ],
+    }
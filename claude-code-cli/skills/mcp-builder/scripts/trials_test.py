@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+
+from trials import is_settled, pass_at_k, pass_hat_k, run_trials, trials_to_settle, wilson_interval
+
+
+def scripted(outcomes):
+    """Helper returning a run_trial whose trials pass or fail as scripted"""
+    started = []
+
+    async def run_trial(trial):
+        started.append(trial)
+        return {"trial": trial, "score": outcomes[trial]}
+
+    return run_trial, started
+
+
+class TestSPRT(unittest.TestCase):
+
+    def test_three_agreeing_trials_settle(self):
+        """With P_PASS = 0.8, P_FAIL = 0.2 and ALPHA = 0.05, each trial moves the LLR by ln 4; the bound is ln 19"""
+        self.assertFalse(is_settled(2, 0))
+        self.assertTrue(is_settled(3, 0))
+        self.assertFalse(is_settled(0, 2))
+        self.assertTrue(is_settled(0, 3))
+        self.assertFalse(is_settled(3, 1))
+        self.assertTrue(is_settled(4, 1))
+
+    def test_trials_to_settle(self):
+        self.assertEqual(trials_to_settle(0, 0), 3)
+        self.assertEqual(trials_to_settle(2, 1), 2)
+        self.assertEqual(trials_to_settle(1, 2), 2)
+
+    def test_stops_after_three_passes(self):
+        run_trial, started = scripted([1] * 10)
+        results = asyncio.run(run_trials(run_trial, 10))
+        self.assertEqual(len(results), 3)
+        self.assertEqual(sorted(started), [0, 1, 2])
+
+    def test_mixed_results_stop_at_expected_trial(self):
+        """P, F, P leaves the LLR at ln 4, so a wave of two more passes settles it at trial 5"""
+        run_trial, started = scripted([1, 0, 1, 1, 1, 0, 0, 0, 0, 0])
+        results = asyncio.run(run_trials(run_trial, 10))
+        self.assertEqual([result["trial"] for result in results], [0, 1, 2, 3, 4])
+        self.assertEqual(len(started), 5)
+
+    def test_unsettled_question_runs_to_max_trials(self):
+        run_trial, _ = scripted([1, 0] * 5)
+        self.assertEqual(len(asyncio.run(run_trials(run_trial, 10))), 10)
+
+    def test_without_early_stop_runs_all_trials(self):
+        run_trial, _ = scripted([1] * 6)
+        self.assertEqual(len(asyncio.run(run_trials(run_trial, 6, early_stop=False))), 6)
+
+
+class TestWilson(unittest.TestCase):
+
+    def test_known_interval(self):
+        low, high = wilson_interval(8, 10)
+        self.assertAlmostEqual(low, 0.4902, places=4)
+        self.assertAlmostEqual(high, 0.9433, places=4)
+
+    def test_extremes_stay_in_bounds(self):
+        low, high = wilson_interval(0, 5)
+        self.assertEqual(low, 0.0)
+        self.assertAlmostEqual(high, 0.4345, places=4)
+        low, high = wilson_interval(5, 5)
+        self.assertAlmostEqual(low, 0.5655, places=4)
+        self.assertEqual(high, 1.0)
+        self.assertEqual(wilson_interval(0, 0), (0.0, 1.0))
+
+
+class TestPassAtK(unittest.TestCase):
+
+    def test_unbiased_estimator(self):
+        """1 - C(n - c, k) / C(n, k)"""
+        self.assertAlmostEqual(pass_at_k(5, 2, 2), 1 - 3 / 10)
+        self.assertAlmostEqual(pass_at_k(10, 3, 1), 0.3)
+        self.assertEqual(pass_at_k(5, 0, 3), 0.0)
+        self.assertEqual(pass_at_k(5, 4, 2), 1.0)
+
+    def test_plug_in_when_stopped_early(self):
+        self.assertAlmostEqual(pass_at_k(2, 1, 3), 1 - 0.5**3)
+        self.assertEqual(pass_at_k(0, 0, 3), 0.0)
+
+    def test_pass_hat_k(self):
+        """C(c, k) / C(n, k)"""
+        self.assertAlmostEqual(pass_hat_k(5, 3, 2), 3 / 10)
+        self.assertAlmostEqual(pass_hat_k(3, 3, 5), 1.0)
+        self.assertAlmostEqual(pass_hat_k(2, 1, 3), 0.125)
+
+
+if __name__ == "__main__":
+    unittest.main()